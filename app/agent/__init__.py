@@ -1,36 +1,61 @@
 from langgraph.graph import START, END, StateGraph
 
-from app.agent.nodes import check_answerability, check_hallucination, fallback, generate, retrieve
+from app.agent.nodes import (
+    check_answerability, check_hallucination, check_speculative_generation,
+    fallback, generate, retrieve, speculative_generate
+)
+from app.core.config import settings
 from app.agent.state import GraphState
-from langgraph.checkpoint.memory import MemorySaver
+from app.agent.checkpoint import get_checkpointer
+
+memory = get_checkpointer()
 
-memory = MemorySaver()
+# Nodes and conditional edges timed by the metrics callback handler
+NODE_NAMES = (
+    "retrieve", "generate", "fallback",
+    "check_answerability", "check_hallucination", "check_speculative_generation"
+)
 
 workflow = StateGraph(GraphState)
 
 workflow.add_node("retrieve", retrieve)
-workflow.add_node("generate", generate)
 workflow.add_node("fallback", fallback)
 
 
 workflow.add_edge(START, 'retrieve')
 
-workflow.add_conditional_edges(
-    'retrieve',
-    check_answerability,
-    {
-        "answerable": 'generate',
-        "not answerable": 'fallback'
-    }
-)
-workflow.add_conditional_edges(
-    'generate',
-    check_hallucination,
-    {
-        "useful": END,
-        "not supported": 'fallback'
-    }
-)
+if settings.SPECULATIVE_GENERATION:
+    # Answerability is graded while the answer is generated
+    workflow.add_node("generate", speculative_generate)
+    workflow.add_edge('retrieve', 'generate')
+    workflow.add_conditional_edges(
+        'generate',
+        check_speculative_generation,
+        {
+            "useful": END,
+            "not supported": 'fallback',
+            "not answerable": 'fallback'
+        }
+    )
+else:
+    workflow.add_node("generate", generate)
+    workflow.add_conditional_edges(
+        'retrieve',
+        check_answerability,
+        {
+            "answerable": 'generate',
+            "not answerable": 'fallback'
+        }
+    )
+    workflow.add_conditional_edges(
+        'generate',
+        check_hallucination,
+        {
+            "useful": END,
+            "not supported": 'fallback'
+        }
+    )
+
 workflow.add_edge('fallback', END)
 
 graph = workflow.compile(checkpointer=memory)
\ No newline at end of file
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from app.core.config import settings
+
+# answerability, qa and hallucination grading calls skipped by every hit
+LLM_CALLS_PER_ANSWER = 3
+
+
+class SemanticAnswerCache:
+    """
+    Size-bounded cache of graded answers keyed on the query embedding.
+
+    A lookup returns the stored answer of the most similar cached query with
+    the same document scope when their cosine similarity reaches `threshold`.
+    Entries are evicted in LRU order once `max_entries` is exceeded.
+    """
+
+    def __init__(self, max_entries=1000, threshold=0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_latency = 0.0
+        self.miss_latency = 0.0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector, scope=None):
+        """
+        Finds a cached answer for a query.
+
+        Args:
+            vector (list): Embedding of the query.
+            scope (frozenset): Document ids in scope, None for every document.
+
+        Returns:
+            str | None: The cached answer, or None on a miss.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry['scope'] == scope]
+            if not keys:
+                return None
+            matrix = np.stack([self._entries[key]['vector'] for key in keys])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]]['answer']
+
+    def store(self, vector, answer, scope=None):
+        """
+        Caches a graded answer.
+
+        Args:
+            vector (list): Embedding of the query.
+            answer (str): The answer that passed grading.
+            scope (frozenset): Document ids in scope, None for every document.
+        """
+        with self._lock:
+            self._entries[self._next_key] = {'vector': self._normalize(vector), 'answer': answer, 'scope': scope}
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, document_id=None):
+        """
+        Drops the answers that may depend on a document.
+
+        Args:
+            document_id (str): The re-ingested document, None to clear the cache.
+        """
+        with self._lock:
+            if document_id is None:
+                self._entries.clear()
+                return
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry['scope'] is None or document_id in entry['scope']
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def record(self, hit, latency):
+        """
+        Records the outcome and latency in seconds of a chat request.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_latency += latency
+            else:
+                self.misses += 1
+                self.miss_latency += latency
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Hit rate, saved LLM calls and mean latency of hits and misses.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'saved_llm_calls': self.hits * LLM_CALLS_PER_ANSWER,
+                'mean_hit_latency_seconds': self.hit_latency / self.hits if self.hits else 0.0,
+                'mean_miss_latency_seconds': self.miss_latency / self.misses if self.misses else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+)
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.core.config import settings
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer that evicts idle threads and old checkpoints.
+
+    Threads are kept in LRU order: the least recently used thread is dropped
+    once `max_threads` is exceeded, and threads idle for longer than
+    `ttl_seconds` are dropped on the next write. Only the latest
+    `max_checkpoints` checkpoints of every thread are kept.
+    """
+
+    def __init__(self, max_threads=1000, ttl_seconds=86400, max_checkpoints=4, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints = max_checkpoints
+        self._last_access = OrderedDict()
+        self._lock = RLock()
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._last_access[thread_id] = time.monotonic()
+            self._last_access.move_to_end(thread_id)
+
+    def _drop_thread(self, thread_id):
+        self.storage.pop(thread_id, None)
+        for key in [key for key in self.writes if key[0] == thread_id]:
+            del self.writes[key]
+        blobs = getattr(self, "blobs", None)
+        if blobs is not None:
+            for key in [key for key in blobs if key[0] == thread_id]:
+                del blobs[key]
+        self._last_access.pop(thread_id, None)
+
+    def _prune_checkpoints(self, thread_id):
+        for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+            # Checkpoint ids are time ordered, so the oldest sort first
+            stale = sorted(checkpoints)[:-self.max_checkpoints]
+            for checkpoint_id in stale:
+                del checkpoints[checkpoint_id]
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._last_access:
+            thread_id, last_access = next(iter(self._last_access.items()))
+            if len(self._last_access) > self.max_threads or now - last_access > self.ttl_seconds:
+                self._drop_thread(thread_id)
+            else:
+                break
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._touch(config)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            self._touch(config)
+            self._prune_checkpoints(thread_id)
+            self._evict()
+            return result
+
+    def put_writes(self, config, writes, task_id):
+        with self._lock:
+            return super().put_writes(config, writes, task_id)
+
+
+def get_checkpointer():
+    """
+    Builds the checkpointer selected by `settings.CHECKPOINT_BACKEND`.
+
+    Returns:
+        BaseCheckpointSaver: A bounded in-memory saver, or an async SQLite saver
+        when the backend is "sqlite" (requires `langgraph-checkpoint-sqlite`).
+    """
+    if settings.CHECKPOINT_BACKEND == "sqlite":
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise ImportError(
+                "The sqlite checkpoint backend requires the langgraph-checkpoint-sqlite package"
+            ) from e
+        return AsyncSqliteSaver(aiosqlite.connect(settings.CHECKPOINT_SQLITE_PATH))
+
+    return BoundedMemorySaver(
+        max_threads=settings.CHECKPOINT_MAX_THREADS,
+        ttl_seconds=settings.CHECKPOINT_TTL_SECONDS,
+        max_checkpoints=settings.CHECKPOINT_MAX_PER_THREAD,
+    )
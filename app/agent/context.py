@@ -0,0 +1,144 @@
+from functools import lru_cache
+from threading import Lock
+
+import tiktoken
+
+from app.core.config import settings
+
+
+# Rough size of a token when the tokenizer files cannot be loaded (offline)
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        try:
+            return tiktoken.encoding_for_model(settings.OPENAI_CHAT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"> ❌ \033[91mCould not load the tokenizer, estimating token counts: {e}\033[0m")
+        return None
+
+
+def count_tokens(text):
+    """
+    Counts the tokens of a text with the chat model's tokenizer.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text or "") // CHARS_PER_TOKEN)
+    return len(encoding.encode(text or ""))
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    Truncates a text to at most `max_tokens` tokens.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        if len(text or "") <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        return text[:max_tokens * CHARS_PER_TOKEN] + " ..."
+    tokens = encoding.encode(text or "")
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + " ..."
+
+
+def split_tokens(text, max_tokens):
+    """
+    Splits a text on token boundaries into pieces of at most `max_tokens` tokens.
+    """
+    max_tokens = max(1, max_tokens)
+    encoding = get_encoding()
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[start:start + size] for start in range(0, len(text or ""), size)]
+    tokens = encoding.encode(text or "")
+    pieces, start = [], 0
+    while start < len(tokens):
+        end = min(len(tokens), start + max_tokens)
+        piece = encoding.decode(tokens[start:end])
+        # A piece cut inside a character may encode to more tokens than it was decoded from
+        while end - start > 1 and len(encoding.encode(piece)) > max_tokens:
+            end -= 1
+            piece = encoding.decode(tokens[start:end])
+        pieces.append(piece)
+        start = end
+    return pieces
+
+
+def pack_documents(documents, token_budget=None):
+    """
+    Assembles the retrieved chunks into a context that fits the token budget.
+
+    Duplicate chunks are dropped and the rest are kept by descending retriever
+    score (retriever order when there is no score) until the budget is spent.
+
+    Args:
+        documents (list): The retrieved documents.
+        token_budget (int): Maximum number of context tokens.
+
+    Returns:
+        str: The packed context.
+    """
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    unique = {}
+    for position, document in enumerate(documents):
+        key = document.metadata.get('chunk_id') or document.page_content
+        if key not in unique:
+            unique[key] = (document.metadata.get('score', -position), position, document)
+    ranked = sorted(unique.values(), key=lambda item: (-item[0], item[1]))
+
+    kept, used = [], 0
+    for _, _, document in ranked:
+        tokens = count_tokens(document.page_content)
+        if used + tokens > token_budget:
+            continue
+        kept.append(document.page_content)
+        used += tokens
+    return "\n\n".join(kept)
+
+
+class TokenReport:
+    """
+    Per-request accounting of the prompt tokens sent by every graph node.
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._lock = Lock()
+
+    def record(self, node, *texts):
+        """
+        Adds the tokens of the prompt inputs of one LLM call made by `node`.
+        """
+        tokens = sum(count_tokens(text) for text in texts)
+        with self._lock:
+            entry = self._nodes.setdefault(node, {'calls': 0, 'input_tokens': 0})
+            entry['calls'] += 1
+            entry['input_tokens'] += tokens
+
+    def as_dict(self):
+        with self._lock:
+            nodes = {node: dict(entry) for node, entry in self._nodes.items()}
+        return {
+            'nodes': nodes,
+            'input_tokens': sum(entry['input_tokens'] for entry in nodes.values()),
+        }
+
+
+def record_tokens(config, node, *texts):
+    """
+    Records prompt tokens in the run's TokenReport, if the caller passed one.
+
+    Args:
+        config (RunnableConfig): The run config, holding `token_report` in its configurable.
+        node (str): Name of the node making the LLM call.
+        texts (str): The variable prompt inputs.
+    """
+    report = (config or {}).get("configurable", {}).get("token_report")
+    if report is not None:
+        report.record(node, *texts)
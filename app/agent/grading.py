@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from functools import lru_cache
+from threading import Lock
+
+from app.agent.rerank import tokenize
+from app.core.config import settings
+from app.core.metrics import grader_verdicts
+
+NUMBER_PATTERN = re.compile(r'^\d')
+# Words that flip the polarity of a sentence, "n't" and "cannot" count as "not"
+NEGATION_PATTERN = re.compile(r"\b(no|not|nor|never|none|neither|nobody|nothing|nowhere|without)\b|n['’]t\b|\bcannot\b")
+
+# Expired verdicts are purged once every this many writes
+PURGE_EVERY = 1000
+
+
+class GradeStore:
+    """
+    Grader verdicts in SQLite, expiring `ttl_seconds` after they are stored.
+
+    The database file is shared by every worker process of the app.
+    """
+
+    def __init__(self, path, ttl_seconds=3600):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS grades (
+                key TEXT PRIMARY KEY,
+                grade TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._lock = Lock()
+        self._writes = 0
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        """
+        Returns:
+            str | None: The stored verdict, or None if it is missing or expired.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT grade FROM grades WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, grade):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grades (key, grade, expires_at) VALUES (?, ?, ?)",
+                (key, grade, now + self.ttl_seconds)
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM grades WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+
+
+@lru_cache(maxsize=1)
+def get_grade_store():
+    return GradeStore(settings.GRADE_CACHE_PATH, ttl_seconds=settings.GRADE_CACHE_TTL_SECONDS)
+
+
+def grade_key(grader, template, inputs):
+    """
+    Computes the memoisation key of a grader call.
+
+    Args:
+        grader (str): Name of the grader.
+        template (str): The grader's prompt template.
+        inputs (dict): The prompt inputs.
+
+    Returns:
+        str: Hex SHA-256 digest of the grader, template, chat model and inputs.
+    """
+    payload = json.dumps([grader, template, settings.OPENAI_CHAT_MODEL, inputs], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cached(grader, template, inputs):
+    if not settings.GRADE_CACHE_ENABLED:
+        return None, None
+    key = grade_key(grader, template, inputs)
+    verdict = get_grade_store().get(key)
+    if verdict is not None:
+        print(f"> ♻️  Reusing the {grader} verdict")
+        grader_verdicts.inc(grader=grader, source="cache")
+    return key, verdict
+
+
+def _remember(grader, key, verdict):
+    grader_verdicts.inc(grader=grader, source="llm")
+    if key is not None:
+        get_grade_store().put(key, verdict)
+
+
+def grade(grader, template, chain, inputs, on_call=None):
+    """
+    Runs a yes/no grader chain, reusing the verdict of an identical earlier call.
+
+    Args:
+        grader (str): Name of the grader.
+        template (str): The grader's prompt template, part of the key.
+        chain (Runnable): The grader chain, returning an object with a `grade`.
+        inputs (dict): The prompt inputs.
+        on_call (callable): Called before the LLM is actually called.
+
+    Returns:
+        str: The verdict, "yes" or "no".
+    """
+    key, verdict = _cached(grader, template, inputs)
+    if verdict is not None:
+        return verdict
+    if on_call:
+        on_call()
+    verdict = chain.invoke(inputs).grade
+    _remember(grader, key, verdict)
+    return verdict
+
+
+async def agrade(grader, template, chain, inputs, on_call=None):
+    """
+    Async version of `grade`.
+    """
+    key, verdict = _cached(grader, template, inputs)
+    if verdict is not None:
+        return verdict
+    if on_call:
+        on_call()
+    verdict = (await chain.ainvoke(inputs)).grade
+    _remember(grader, key, verdict)
+    return verdict
+
+
+def negations(text):
+    """
+    Returns:
+        set: The negation words of a text, contractions and "cannot" normalised to "not".
+    """
+    return {
+        match.group(1) or "not"
+        for match in NEGATION_PATTERN.finditer((text or "").lower())
+    }
+
+
+def lexically_grounded(generation, documents):
+    """
+    Cheap check that an answer only repeats the documents.
+
+    The answer is grounded when it has at least `settings.GROUNDING_MIN_TERMS`
+    content words, `settings.GROUNDING_OVERLAP_THRESHOLD` of them appear in
+    the documents, and so does every number and negation in it. An answer
+    negating what the documents state overlaps them almost entirely, so
+    negations the documents lack always leave the decision to the LLM grader.
+
+    Args:
+        generation (str): The generated answer.
+        documents (str): The context the answer was generated from.
+
+    Returns:
+        bool: True when the answer is grounded with high confidence, False when unsure.
+    """
+    # Short words are mostly stopwords and tell little about grounding
+    terms = {term for term in tokenize(generation) if len(term) > 3 or NUMBER_PATTERN.match(term)}
+    if len(terms) < settings.GROUNDING_MIN_TERMS:
+        return False
+    if negations(generation) - negations(documents):
+        return False
+    context = set(tokenize(documents))
+    missing = terms - context
+    if any(NUMBER_PATTERN.match(term) for term in missing):
+        return False
+    return 1 - len(missing) / len(terms) >= settings.GROUNDING_OVERLAP_THRESHOLD
@@ -0,0 +1,343 @@
+import json
+import os
+import time
+from collections import namedtuple
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+
+from app.core.config import settings
+
+INGESTED_DOCUMENTS_QUERY = '''
+MATCH (d:Document) WHERE d.ingested = true
+RETURN d.documentId AS document_id
+'''
+
+DOCUMENT_CHUNKS_QUERY = '''
+MATCH (d:Document {documentId: $document_id})-[:HAS_CHUNK]->(c:Chunk)
+WHERE c.textEmbedding IS NOT NULL
+RETURN c.chunkId AS chunk_id, c.text AS text, c.page AS page, c.textEmbedding AS embedding
+'''
+
+# Rows assigned to clusters per batch while building the inverted file
+ASSIGN_BATCH_SIZE = 65536
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_CLUSTER = 16
+
+Snapshot = namedtuple("Snapshot", "matrix chunk_ids texts pages documents live ivf")
+
+EMPTY_SNAPSHOT = Snapshot(None, [], [], [], {}, np.zeros(0, dtype=bool), None)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores, k):
+    k = min(k, scores.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class InvertedFile:
+    """
+    Coarse k-means quantizer: searches only score the rows of the clusters
+    closest to the query.
+    """
+
+    def __init__(self, centroids, lists, trained_rows):
+        self.centroids = centroids
+        self.lists = lists
+        self.trained_rows = trained_rows
+
+    @classmethod
+    def build(cls, matrix, rows, seed=0):
+        """
+        Clusters `rows` of `matrix` with spherical k-means on a sample.
+
+        Args:
+            matrix (np.ndarray): The normalised embeddings.
+            rows (np.ndarray): Rows to index.
+
+        Returns:
+            InvertedFile: The index.
+        """
+        rng = np.random.default_rng(seed)
+        nlist = min(rows.size, max(1, int(4 * np.sqrt(rows.size))))
+        sample = matrix[np.sort(rng.choice(rows, size=min(rows.size, nlist * KMEANS_SAMPLE_PER_CLUSTER), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            counts = np.bincount(assignment, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = centroids.copy()
+            filled = counts > 0
+            sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+            centroids = _normalize(sums)
+
+        index = cls(centroids, [np.zeros(0, dtype=np.int64)] * nlist, rows.size)
+        return index.add(matrix, rows)
+
+    def add(self, matrix, rows):
+        """
+        Returns:
+            InvertedFile: A copy of the index with `rows` assigned to their closest clusters.
+        """
+        lists = list(self.lists)
+        for start in range(0, rows.size, ASSIGN_BATCH_SIZE):
+            batch = rows[start:start + ASSIGN_BATCH_SIZE]
+            assignment = np.argmax(matrix[batch] @ self.centroids.T, axis=1)
+            for cluster in np.unique(assignment):
+                lists[cluster] = np.concatenate([lists[cluster], batch[assignment == cluster]])
+        return InvertedFile(self.centroids, lists, self.trained_rows)
+
+    def candidates(self, query, nprobe):
+        probes = _top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self.lists[cluster] for cluster in probes])
+
+
+class LocalVectorIndex:
+    """
+    In-process copy of the chunk embeddings stored in Neo4j.
+
+    Normalised embeddings are appended to a memory-mapped float32 matrix in
+    `path/vectors.f32` and `path/index.json` maps its rows to chunk ids, texts
+    and pages, and every synced document to its rows. Rows no longer used by
+    any document are skipped and the file is compacted once half of it is
+    unused. From `ivf_min_chunks` rows on, unscoped searches only score the
+    `nprobe` closest clusters of an inverted file instead of every row.
+
+    Searches read an immutable snapshot, so they never wait for a sync.
+    """
+
+    def __init__(self, path, ivf_min_chunks=50000, nprobe=8):
+        self.path = path
+        self.ivf_min_chunks = ivf_min_chunks
+        self.nprobe = nprobe
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._meta_path = os.path.join(path, "index.json")
+        self._lock = Lock()
+        self._row_of = {}
+        self._stale = True
+        self._synced_at = 0.0
+        self._snapshot = EMPTY_SNAPSHOT
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return int(self._snapshot.live.sum())
+
+    def _map(self, rows, dimensions):
+        if not rows:
+            return None
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, dimensions))
+
+    def _load(self):
+        try:
+            with open(self._meta_path) as file:
+                meta = json.load(file)
+            chunk_ids, pages, texts = (list(column) for column in zip(*meta["chunks"])) if meta["chunks"] else ([], [], [])
+            if os.path.getsize(self._vectors_path) != len(chunk_ids) * meta["dimensions"] * 4:
+                raise ValueError("the vectors file does not match the index")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"> ❌ \033[91mDiscarding the local vector index: {e}\033[0m")
+            for path in (self._meta_path, self._vectors_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        documents = {document_id: np.asarray(rows, dtype=np.int64) for document_id, rows in meta["documents"].items()}
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+        self._snapshot = self._publish(self._map(len(chunk_ids), meta["dimensions"]), chunk_ids, texts, pages, documents)
+
+    def _save(self, snapshot):
+        meta = {
+            "dimensions": snapshot.matrix.shape[1] if snapshot.matrix is not None else 0,
+            "chunks": list(zip(snapshot.chunk_ids, snapshot.pages, snapshot.texts)),
+            "documents": {document_id: rows.tolist() for document_id, rows in snapshot.documents.items()},
+        }
+        with open(self._meta_path + ".tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+
+    def _publish(self, matrix, chunk_ids, texts, pages, documents, ivf=None, added_rows=None):
+        live = np.zeros(len(chunk_ids), dtype=bool)
+        for rows in documents.values():
+            live[rows] = True
+
+        live_count = int(live.sum())
+        if live_count < self.ivf_min_chunks:
+            ivf = None
+        elif ivf is None or added_rows is None or live_count > 1.5 * ivf.trained_rows:
+            ivf = InvertedFile.build(matrix, np.flatnonzero(live))
+        elif added_rows.size:
+            ivf = ivf.add(matrix, added_rows)
+        return Snapshot(matrix, chunk_ids, texts, pages, documents, live, ivf)
+
+    def _compact(self, snapshot):
+        keep = np.flatnonzero(snapshot.live)
+        remap = np.full(len(snapshot.chunk_ids), -1, dtype=np.int64)
+        remap[keep] = np.arange(keep.size)
+
+        with open(self._vectors_path + ".tmp", "wb") as file:
+            for start in range(0, keep.size, ASSIGN_BATCH_SIZE):
+                file.write(np.ascontiguousarray(snapshot.matrix[keep[start:start + ASSIGN_BATCH_SIZE]]).tobytes())
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+
+        chunk_ids = [snapshot.chunk_ids[row] for row in keep]
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+        return self._publish(
+            self._map(keep.size, snapshot.matrix.shape[1]),
+            chunk_ids,
+            [snapshot.texts[row] for row in keep],
+            [snapshot.pages[row] for row in keep],
+            {document_id: remap[rows] for document_id, rows in snapshot.documents.items()},
+        )
+
+    def sync_due(self):
+        return self._stale or time.monotonic() - self._synced_at > settings.LOCAL_INDEX_SYNC_SECONDS
+
+    def mark_stale(self):
+        """
+        Makes the next search sync the index, called when documents change.
+        """
+        self._stale = True
+
+    def maybe_sync(self, graphdb):
+        """
+        Syncs the index if it is stale, unless another thread is already syncing it.
+        """
+        if not self.sync_due():
+            return
+        # Searches keep using the current snapshot while a sync runs, except
+        # on the first one, when there is nothing to search yet
+        if not self._lock.acquire(blocking=self._snapshot.matrix is None):
+            return
+        try:
+            if self.sync_due():
+                self._sync(graphdb)
+        except Exception as e:
+            print(f"> ❌ \033[91mCould not sync the local vector index: {e}\033[0m")
+        finally:
+            self._lock.release()
+
+    def sync(self, graphdb):
+        """
+        Brings the index up to date with the ingested documents in the graph.
+
+        Only the chunks of new documents are fetched; documents removed from
+        the graph are dropped from the index.
+
+        Args:
+            graphdb (Neo4jGraph): The graph database connection.
+
+        Returns:
+            int: Number of new rows.
+        """
+        with self._lock:
+            return self._sync(graphdb)
+
+    def _sync(self, graphdb):
+        current = {row['document_id'] for row in graphdb.query(INGESTED_DOCUMENTS_QUERY)}
+        snapshot = self._snapshot
+        documents = {document_id: rows for document_id, rows in snapshot.documents.items() if document_id in current}
+        added = sorted(current - set(documents))
+        if not added and len(documents) == len(snapshot.documents):
+            self._stale = False
+            self._synced_at = time.monotonic()
+            return 0
+
+        chunk_ids, texts, pages = list(snapshot.chunk_ids), list(snapshot.texts), list(snapshot.pages)
+        row_of = dict(self._row_of)
+        dimensions = snapshot.matrix.shape[1] if snapshot.matrix is not None else None
+        first_new_row = len(chunk_ids)
+        with open(self._vectors_path, "ab") as file:
+            # Drops the vectors appended by a sync that failed halfway
+            file.truncate(first_new_row * (dimensions or 0) * 4)
+            for document_id in added:
+                rows = []
+                for chunk in graphdb.query(DOCUMENT_CHUNKS_QUERY, params={'document_id': document_id}):
+                    row = row_of.get(chunk['chunk_id'])
+                    if row is None:
+                        vector = _normalize(chunk['embedding'])
+                        dimensions = dimensions or vector.size
+                        if vector.size != dimensions:
+                            raise ValueError(f"Chunk {chunk['chunk_id']} has {vector.size} dimensions, expected {dimensions}")
+                        file.write(vector.tobytes())
+                        row = len(chunk_ids)
+                        row_of[chunk['chunk_id']] = row
+                        chunk_ids.append(chunk['chunk_id'])
+                        texts.append(chunk['text'])
+                        pages.append(chunk['page'])
+                    rows.append(row)
+                documents[document_id] = np.asarray(rows, dtype=np.int64)
+
+        matrix = self._map(len(chunk_ids), dimensions) if len(chunk_ids) != first_new_row else snapshot.matrix
+        new_rows = np.arange(first_new_row, len(chunk_ids))
+        updated = self._publish(matrix, chunk_ids, texts, pages, documents, snapshot.ivf, new_rows)
+        self._row_of = row_of
+        if updated.live.size and updated.live.sum() < updated.live.size / 2:
+            updated = self._compact(updated)
+        self._save(updated)
+
+        self._snapshot = updated
+        self._stale = False
+        self._synced_at = time.monotonic()
+        print(f"> 🔄 Local vector index synced: {len(added)} new documents, {len(self)} chunks")
+        return new_rows.size
+
+    def search(self, vector, k, document_ids=None):
+        """
+        Finds the chunks most similar to a query embedding.
+
+        Args:
+            vector (list): Embedding of the query.
+            k (int): Number of chunks to return.
+            document_ids (list): Only search the chunks of these documents.
+
+        Returns:
+            list: (chunk_id, text, page, score) tuples by descending cosine similarity.
+        """
+        snapshot = self._snapshot
+        if snapshot.matrix is None:
+            return []
+        query = _normalize(vector)
+
+        if document_ids:
+            scoped = [snapshot.documents[document_id] for document_id in document_ids if document_id in snapshot.documents]
+            rows = np.unique(np.concatenate(scoped)) if scoped else np.zeros(0, dtype=np.int64)
+        elif snapshot.ivf is not None:
+            rows = snapshot.ivf.candidates(query, self.nprobe)
+            rows = rows[snapshot.live[rows]]
+        elif snapshot.live.all():
+            rows = None
+        else:
+            rows = np.flatnonzero(snapshot.live)
+
+        if rows is None:
+            scores = snapshot.matrix @ query
+            rows = np.arange(scores.size)
+        elif rows.size:
+            scores = snapshot.matrix[rows] @ query
+        else:
+            return []
+
+        return [
+            (snapshot.chunk_ids[rows[i]], snapshot.texts[rows[i]], snapshot.pages[rows[i]], float(scores[i]))
+            for i in _top_k(scores, k)
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_local_index():
+    return LocalVectorIndex(
+        settings.LOCAL_INDEX_PATH,
+        ivf_min_chunks=settings.LOCAL_INDEX_IVF_MIN_CHUNKS,
+        nprobe=settings.LOCAL_INDEX_NPROBE
+    )
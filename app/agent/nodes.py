@@ -1,44 +1,61 @@
+import asyncio
 from app.agent.state import GraphState
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from app.agent.tools import retriever_tool
-from app.agent.utils import format_chat_history, qa_chain, answerability_chain, hallucination_chain, fallback_chain
-
-
-def retrieve(state: GraphState):
+from langchain_core.messages import AIMessage, ToolMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
+from app.agent.context import pack_documents, record_tokens
+from app.agent.grading import agrade, grade, lexically_grounded
+from app.agent.prompts import hallucination_prompt_template
+from app.agent.rerank import rerank
+from app.core.metrics import grader_verdicts
+from app.agent.utils import (
+    format_chat_history, latest_question, trim_history, get_retriever, get_scoped_retriever, retrieval_k,
+    get_qa_chain, get_answerability_chain, get_hallucination_chain, get_fallback_chain,
+    answerability_prompt_template
+)
+
+
+async def retrieve(state: GraphState, config: RunnableConfig):
     """
     Retrieves the documents from the vectorstore.
     
     Args:
         state (dict): The current graph state
+        config (RunnableConfig): The run config, `document_ids` in its configurable restricts the search
 
     Returns:
-        state (dict): New key added to state, documents, that contains retrieved documents
+        state (dict): New key added to state, documents, that contains retrieved documents,
+            and removals for the messages beyond the history cap
     """
     
     print(f"> 📃 Retrieving documents...")
-    user_messages = [msg.content for msg in state["messages"] if isinstance(msg, HumanMessage)]
-    query = user_messages[-1] if user_messages else ""
-    
-    retriever_input = {"query": query}
-    
-    response = retriever_tool.invoke(retriever_input)
-    
+    _, query = latest_question(state["messages"])
     
+    # Over-fetched when reranking, the reranker keeps at most RETRIEVER_K
+    fetch_k = retrieval_k()
+    document_ids = config.get("configurable", {}).get("document_ids")
+    retriever = get_scoped_retriever(document_ids, k=fetch_k) if document_ids else get_retriever(k=fetch_k)
+    documents = await retriever.ainvoke(query, config)
+    documents = await asyncio.to_thread(rerank, query, documents)
+
+    # Deduplicated, ranked and packed within the context token budget
+    response = pack_documents(documents)
+
     tool_message = ToolMessage(
         content=response,
         tool_name="retriever",
         tool_call_id='id'
     )
 
-    return {"messages": [tool_message]}
+    return {"messages": trim_history(state["messages"]) + [tool_message]}
 
 
-def check_answerability(state: dict):
+def check_answerability(state: dict, config: RunnableConfig):
     """
     Check if the question can be answered based on the provided documents in the state.
 
     Args:
         state (dict): The current state containing documents and the question.
+        config (RunnableConfig): The run config, used for token accounting.
 
     Returns:
         str: "answerable" if the question can be answered, otherwise "not answerable".
@@ -53,21 +70,26 @@ def check_answerability(state: dict):
         print("> ❌ \033[91mMissing documents or question in the state\033[0m")
         return "not answerable"
 
-    result = answerability_chain.invoke({"documents": docs, "question": question})
-    
-    if result.grade == "yes":
+    verdict = grade(
+        "check_answerability", answerability_prompt_template, get_answerability_chain(),
+        {"documents": docs, "question": question},
+        on_call=lambda: record_tokens(config, "check_answerability", docs, question)
+    )
+
+    if verdict == "yes":
         print("> ✅ \033[92mThe question can be answered with the provided documents\033[0m")
         return "answerable"
     else:
         print("> ❌ \033[91mThe question cannot be answered with the provided documents\033[0m")
         return "not answerable"
 
-def generate(state: GraphState):
+def generate(state: GraphState, config: RunnableConfig):
     """
     Generates an answer using the retrieved documents/query results.
     
     Args:
         state (dict): The current graph state
+        config (RunnableConfig): The run config, forwarded so tokens can be streamed
 
     Returns:
         state (dict): New key added to state, generation, that contains LLM generation
@@ -79,36 +101,95 @@ def generate(state: GraphState):
     question = messages[-2].content
     last_message = messages[-1]
     docs = last_message.content
-    response = qa_chain.invoke({"question": question, "context": docs, "chat_history": format_chat_history(messages[:-1])})
+    chat_history = format_chat_history(messages[:-2])
+    record_tokens(config, "generate", question, docs, chat_history)
+    response = get_qa_chain().invoke({"question": question, "context": docs, "chat_history": chat_history}, config)
     
     return {"messages": [AIMessage(content=response)]}
 
 
-def fallback(state):
+async def speculative_generate(state: GraphState, config: RunnableConfig):
+    """
+    Generates an answer while the answerability grader runs concurrently.
+
+    The generation is cancelled and discarded if the grader decides the
+    documents cannot answer the question.
+
+    Args:
+        state (dict): The current graph state
+        config (RunnableConfig): The run config, forwarded so tokens can be streamed
+
+    Returns:
+        state (dict): The LLM generation, or no new messages if the question is not answerable
+    """
+
+    print(f"> 🧠 Generating an answer while grading answerability ...")
+
+    messages = state["messages"]
+    question = messages[-2].content
+    docs = messages[-1].content
+
+    if not docs or not question:
+        print("> ❌ \033[91mMissing documents or question in the state\033[0m")
+        return {"messages": []}
+
+    chat_history = format_chat_history(messages[:-2])
+    record_tokens(config, "generate", question, docs, chat_history)
+    generation = asyncio.create_task(
+        get_qa_chain().ainvoke({"question": question, "context": docs, "chat_history": chat_history}, config)
+    )
+    try:
+        verdict = await agrade(
+            "check_answerability", answerability_prompt_template, get_answerability_chain(),
+            {"documents": docs, "question": question},
+            on_call=lambda: record_tokens(config, "check_answerability", docs, question)
+        )
+    except BaseException:
+        generation.cancel()
+        raise
+
+    if verdict != "yes":
+        generation.cancel()
+        print("> ❌ \033[91mThe question cannot be answered with the provided documents\033[0m")
+        return {"messages": []}
+
+    print("> ✅ \033[92mThe question can be answered with the provided documents\033[0m")
+    response = await generation
+    return {"messages": [AIMessage(content=response)]}
+
+
+def fallback(state, config: RunnableConfig):
     """
     Fallback to LLM's internal knowledge.
     
     Args:
         state (dict): The current graph state
+        config (RunnableConfig): The run config, forwarded so tokens can be streamed
 
     Returns:
-        state (dict): New key added to state, generation, that contains LLM generation
+        state (dict): New key added to state, generation, that contains LLM generation,
+            and the removal of the generation rejected by the hallucination grader
     """
     
     print(f"> 👈 Fallback to LLM's internal knowledge ...")
     messages = state["messages"]
-    question = messages[-2].content
+    index, question = latest_question(messages)
+    chat_history = format_chat_history(messages[:index])
 
-    response = fallback_chain.invoke({"question": question, "chat_history":format_chat_history(messages[:-2])})
-    
-    return {"messages": [AIMessage(content=response)]}
+    record_tokens(config, "fallback", question, chat_history)
+    response = get_fallback_chain().invoke({"question": question, "chat_history": chat_history}, config)
 
-def check_hallucination(state: GraphState):
+    # The retracted generation must not be kept as context for later turns
+    retracted = [RemoveMessage(id=messages[-1].id)] if isinstance(messages[-1], AIMessage) else []
+    return {"messages": retracted + [AIMessage(content=response)]}
+
+def check_hallucination(state: GraphState, config: RunnableConfig):
     """
     Check if the generation is hallucinated.
 
     Args:
         state (dict): The current graph state
+        config (RunnableConfig): The run config, used for token accounting
 
     Returns:
         str: Next node to call
@@ -120,13 +201,37 @@ def check_hallucination(state: GraphState):
     docs = messages[-2].content
     generation = last_message.content
     
-    grounded = hallucination_chain.invoke({"documents": docs, "generation": generation})
-    
-    if grounded.grade == "yes":
+    if lexically_grounded(generation, docs):
+        grader_verdicts.inc(grader="check_hallucination", source="heuristic")
+        verdict = "yes"
+    else:
+        verdict = grade(
+            "check_hallucination", hallucination_prompt_template, get_hallucination_chain(),
+            {"documents": docs, "generation": generation},
+            on_call=lambda: record_tokens(config, "check_hallucination", docs, generation)
+        )
+
+    if verdict == "yes":
         print("> ✅ \033[92mAnswer addresses the question\033[0m")
         return "useful"
     
     else:
         print("> ❌ \033[91mGeneration is not grounded in the documents\033[0m")
         return "not supported"
-    
\ No newline at end of file
+
+
+def check_speculative_generation(state: GraphState, config: RunnableConfig):
+    """
+    Routes the output of the speculative generation.
+
+    Args:
+        state (dict): The current graph state
+        config (RunnableConfig): The run config, used for token accounting
+
+    Returns:
+        str: "not answerable" if the generation was discarded, otherwise the hallucination check result
+    """
+
+    if isinstance(state["messages"][-1], ToolMessage):
+        return "not answerable"
+    return check_hallucination(state, config)
@@ -0,0 +1,153 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from app.core.config import settings
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class BM25Scorer:
+    """
+    Okapi BM25 over the candidate chunks only, so it needs no corpus statistics.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query, texts):
+        """
+        Args:
+            query (str): The user question.
+            texts (list): Texts of the candidate chunks.
+
+        Returns:
+            np.ndarray: One relevance score per text.
+        """
+        documents = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(terms.values()) for terms in documents], dtype=np.float32)
+        average_length = lengths.mean() if len(texts) and lengths.mean() else 1.0
+        scores = np.zeros(len(texts), dtype=np.float32)
+        for term in set(tokenize(query)):
+            frequencies = np.array([terms.get(term, 0) for terms in documents], dtype=np.float32)
+            matches = int((frequencies > 0).sum())
+            if not matches:
+                continue
+            idf = math.log(1 + (len(texts) - matches + 0.5) / (matches + 0.5))
+            scores += idf * frequencies * (self.k1 + 1) / (
+                frequencies + self.k1 * (1 - self.b + self.b * lengths / average_length)
+            )
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Local cross-encoder scoring (question, chunk) pairs on the CPU.
+    """
+
+    def __init__(self, model_name):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query, texts):
+        logits = np.asarray(self.model.predict([(query, text) for text in texts]), dtype=np.float32)
+        # Probabilities, so the scores are positive like BM25's
+        return 1 / (1 + np.exp(-logits))
+
+
+@lru_cache(maxsize=1)
+def get_scorer():
+    """
+    Builds the scorer configured by `settings.RERANKER`.
+
+    Returns:
+        BM25Scorer | CrossEncoderScorer | None: The scorer, or None when reranking is disabled.
+    """
+    if settings.RERANKER == "none":
+        return None
+    if settings.RERANKER == "cross-encoder":
+        try:
+            return CrossEncoderScorer(settings.RERANKER_MODEL)
+        except Exception as e:
+            print(f"> ❌ \033[91mCould not load the cross-encoder, reranking with BM25: {e}\033[0m")
+    return BM25Scorer()
+
+
+def _scale(values):
+    # Relative to the best candidate, so near-ties stay near-ties
+    values = np.asarray(values, dtype=np.float32)
+    best = values.max()
+    return values / best if best > 0 else np.zeros_like(values)
+
+
+def adaptive_cutoff(scores, min_k, max_k, gap):
+    """
+    Chooses how many of the best candidates to keep.
+
+    The ranking is cut at the first drop of at least `gap` between two
+    consecutive scores, keeping between `min_k` and `max_k` candidates.
+
+    Args:
+        scores (np.ndarray): Normalised scores sorted in descending order.
+        min_k (int): Minimum number of candidates kept.
+        max_k (int): Maximum number of candidates kept.
+        gap (float): Score drop that ends the ranking.
+
+    Returns:
+        int: The number of candidates to keep.
+    """
+    max_k = min(max_k, len(scores))
+    for position in range(max(1, min_k), max_k):
+        if scores[position - 1] - scores[position] >= gap:
+            return position
+    return max_k
+
+
+def rerank(query, documents, k=None):
+    """
+    Rescores the retrieved candidates and keeps the ones that matter.
+
+    The scorer's relevance is blended with the retriever score (its reciprocal
+    rank when there is none), both relative to the best candidate, with
+    `settings.RERANK_WEIGHT` on the scorer. At most `k` documents are kept,
+    fewer when the blended score drops by `settings.RERANK_SCORE_GAP`.
+
+    Args:
+        query (str): The user question.
+        documents (list): The over-fetched candidates, in retriever order.
+        k (int): Maximum number of documents returned.
+
+    Returns:
+        list: The kept documents by descending score, with the blended `score` in their metadata.
+    """
+    k = k or settings.RETRIEVER_K
+    scorer = get_scorer()
+    if scorer is None or len(documents) <= 1:
+        return documents[:k]
+
+    retriever_scores = [
+        document.metadata.get('score', 1 / (1 + position)) for position, document in enumerate(documents)
+    ]
+    relevance = scorer.score(query, [document.page_content for document in documents])
+    scores = (
+        settings.RERANK_WEIGHT * _scale(relevance)
+        + (1 - settings.RERANK_WEIGHT) * _scale(retriever_scores)
+    )
+
+    order = np.argsort(-scores, kind="stable")
+    keep = adaptive_cutoff(scores[order], settings.RERANK_MIN_K, k, settings.RERANK_SCORE_GAP)
+    kept = []
+    for index in order[:keep]:
+        document = documents[index]
+        document.metadata['retriever_score'] = document.metadata.get('score')
+        document.metadata['score'] = float(scores[index])
+        kept.append(document)
+    return kept
@@ -0,0 +1,188 @@
+import asyncio
+import re
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.config import settings
+from app.core.database.neo4j import run_query
+
+LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+RANKED_UNION = '''
+    WITH collect(node) AS nodes
+    UNWIND range(0, size(nodes) - 1) AS rank
+    RETURN nodes[rank] AS node, $%s_weight / ($rrf_k + rank + 1) AS score
+'''
+
+RRF_FUSION = '''
+WITH node, sum(score) AS score
+ORDER BY score DESC
+LIMIT $k
+RETURN node.text AS text, node.chunkId AS chunk_id, node.page AS page, score
+'''
+
+VECTOR_BRANCH = '''
+    CALL db.index.vector.queryNodes($vector_index, $fetch_k, $embedding) YIELD node
+''' + RANKED_UNION % 'vector'
+
+KEYWORD_BRANCH = '''
+    CALL db.index.fulltext.queryNodes($keyword_index, $keyword_query, {limit: $fetch_k}) YIELD node
+''' + RANKED_UNION % 'keyword'
+
+# Scoped searches only score the chunks of the given documents, so their cost
+# depends on the size of those documents and not on the whole corpus
+SCOPED_VECTOR_BRANCH = '''
+    MATCH (d:Document)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE d.documentId IN $document_ids AND c.textEmbedding IS NOT NULL
+    WITH DISTINCT c
+    WITH c, vector.similarity.cosine(c.textEmbedding, $embedding) AS similarity
+    ORDER BY similarity DESC
+    LIMIT $fetch_k
+    WITH c AS node
+''' + RANKED_UNION % 'vector'
+
+SCOPED_KEYWORD_BRANCH = '''
+    CALL db.index.fulltext.queryNodes($keyword_index, $keyword_query, {limit: $keyword_fetch_k}) YIELD node
+    WHERE EXISTS { MATCH (d:Document)-[:HAS_CHUNK]->(node) WHERE d.documentId IN $document_ids }
+    WITH node LIMIT $fetch_k
+''' + RANKED_UNION % 'keyword'
+
+
+def rrf_query(*branches):
+    return 'CALL {' + '\n    UNION ALL\n'.join(branches) + '}\n' + RRF_FUSION
+
+
+HYBRID_RRF_QUERY = rrf_query(VECTOR_BRANCH, KEYWORD_BRANCH)
+SCOPED_HYBRID_RRF_QUERY = rrf_query(SCOPED_VECTOR_BRANCH, SCOPED_KEYWORD_BRANCH)
+# Used when the question has no searchable words for the full-text index
+VECTOR_RRF_QUERY = rrf_query(VECTOR_BRANCH)
+SCOPED_VECTOR_RRF_QUERY = rrf_query(SCOPED_VECTOR_BRANCH)
+
+# Lucene reads these words as operators when they are upper case
+LUCENE_OPERATORS = re.compile(r'\b(AND|OR|NOT|TO)\b')
+WORD_PATTERN = re.compile(r'\w')
+
+
+def escape_lucene(query):
+    """
+    Escapes a user query so it can be used as a full-text search expression.
+
+    Args:
+        query (str): The raw user query.
+
+    Returns:
+        str: The query with the Lucene special characters escaped and the
+            operator words lower-cased, or "" when it has no words to search.
+    """
+    if not WORD_PATTERN.search(query or ""):
+        return ""
+    query = LUCENE_OPERATORS.sub(lambda match: match.group(1).lower(), query)
+    return LUCENE_SPECIAL_CHARACTERS.sub(r'\\\1', query)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing vector and full-text search over chunks with reciprocal-rank fusion.
+
+    Both searches fetch `fetch_k` candidates and run in a single Cypher query.
+    Every candidate scores `weight / (rrf_k + rank)` per result list it appears
+    in, and the `k` best candidates are returned. When `document_ids` is set,
+    only chunks of those documents are searched.
+    """
+
+    graph: Any
+    embeddings: Any
+    vector_index: str = settings.VECTOR_INDEX_NAME
+    keyword_index: str = settings.KEYWORD_INDEX_NAME
+    k: int = settings.RETRIEVER_K
+    fetch_k: int = settings.RETRIEVER_FETCH_K
+    rrf_k: int = settings.RRF_K
+    vector_weight: float = settings.RRF_VECTOR_WEIGHT
+    keyword_weight: float = settings.RRF_KEYWORD_WEIGHT
+    document_ids: Optional[List[str]] = None
+
+    def _query(self, keyword_query):
+        if not keyword_query:
+            return SCOPED_VECTOR_RRF_QUERY if self.document_ids else VECTOR_RRF_QUERY
+        return SCOPED_HYBRID_RRF_QUERY if self.document_ids else HYBRID_RRF_QUERY
+
+    def _params(self, keyword_query, embedding):
+        return {
+            'document_ids': self.document_ids,
+            # Full-text hits outside the scope are filtered out, so fetch more
+            'keyword_fetch_k': self.fetch_k * settings.RETRIEVER_SCOPED_OVERFETCH,
+            'vector_index': self.vector_index,
+            'keyword_index': self.keyword_index,
+            'embedding': embedding,
+            'keyword_query': keyword_query,
+            'k': self.k,
+            'fetch_k': self.fetch_k,
+            'rrf_k': self.rrf_k,
+            'vector_weight': self.vector_weight,
+            'keyword_weight': self.keyword_weight,
+        }
+
+    @staticmethod
+    def _to_documents(result):
+        return [
+            Document(
+                page_content=row['text'],
+                metadata={'chunk_id': row['chunk_id'], 'page': row['page'], 'score': row['score']}
+            )
+            for row in result
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = self.embeddings.embed_query(query)
+        keyword_query = escape_lucene(query)
+        return self._to_documents(
+            self.graph.query(self._query(keyword_query), params=self._params(keyword_query, embedding))
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        keyword_query = escape_lucene(query)
+        return self._to_documents(await run_query(self._query(keyword_query), self._params(keyword_query, embedding)))
+
+
+class LocalRetriever(BaseRetriever):
+    """
+    Vector retriever over the in-process LocalVectorIndex.
+
+    The index is synced from the graph before searching when documents
+    changed or `LOCAL_INDEX_SYNC_SECONDS` passed since the last sync, so
+    queries on an up-to-date index never leave the process. When
+    `document_ids` is set, only chunks of those documents are searched.
+    """
+
+    index: Any
+    graph: Any
+    embeddings: Any
+    k: int = settings.RETRIEVER_K
+    document_ids: Optional[List[str]] = None
+
+    def _search(self, embedding):
+        return [
+            Document(page_content=text, metadata={'chunk_id': chunk_id, 'page': page, 'score': score})
+            for chunk_id, text, page, score in self.index.search(embedding, self.k, self.document_ids)
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        self.index.maybe_sync(self.graph)
+        return self._search(self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.index.sync_due():
+            await asyncio.to_thread(self.index.maybe_sync, self.graph)
+        return self._search(await self.embeddings.aembed_query(query))
@@ -1,28 +1,110 @@
+from functools import lru_cache
 from pydantic import BaseModel, Field
 from langchain.prompts import ChatPromptTemplate
 from langchain_neo4j import Neo4jVector
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage
 
 from app.core.config import settings
+from app.agent.context import count_tokens, truncate_tokens
+from app.core.database.neo4j import get_neo4j_graph
+from app.core.database.schema import ensure_schema
+from app.core.scheduler import ScheduledChatOpenAI, ScheduledOpenAIEmbeddings
+from app.agent.local_index import get_local_index
+from app.agent.retrievers import HybridRetriever, LocalRetriever
+from app.core.embedding_cache import with_embedding_cache
 from app.agent.prompts import qa_prompt_template, hallucination_prompt_template
 
-llm = ChatOpenAI(model=settings.OPENAI_CHAT_MODEL, temperature=0)
-
-neo4j_vector_store = Neo4jVector.from_existing_graph(
-    embedding=OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL),
-    url=settings.NEO4J_URI,
-    username=settings.NEO4J_USERNAME,
-    password=settings.NEO4J_PASSWORD,
-    index_name="ChunkEmbedding",
-    node_label="Chunk",
-    text_node_properties=["text"],
-    embedding_node_property="textEmbedding",
-)
+# Clients, the vector store and chains are built on first use so importing the
+# app never waits on Neo4j or OpenAI.
+
+@lru_cache(maxsize=1)
+def get_llm():
+    # stream_usage reports token usage for streamed answers too
+    return ScheduledChatOpenAI(model=settings.OPENAI_CHAT_MODEL, temperature=0, stream_usage=True)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    return with_embedding_cache(
+        ScheduledOpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL),
+        settings.OPENAI_EMBEDDING_MODEL
+    )
+
+
+@lru_cache(maxsize=1)
+def get_vector_store():
+    # The index is created by ensure_schema, the one ingestion writes to
+    ensure_schema()
+    return Neo4jVector.from_existing_index(
+        embedding=get_embeddings(),
+        url=settings.NEO4J_URI,
+        username=settings.NEO4J_USERNAME,
+        password=settings.NEO4J_PASSWORD,
+        index_name=settings.VECTOR_INDEX_NAME,
+        text_node_property=settings.VECTOR_SOURCE_PROPERTY,
+        embedding_node_property=settings.VECTOR_EMBEDDING_PROPERTY,
+    )
+
+
+def retrieval_k():
+    """
+    Returns:
+        int: Number of candidates the retrieve node fetches, over-fetched for the reranker.
+    """
+    return settings.RERANK_FETCH_K if settings.RERANKER != "none" else settings.RETRIEVER_K
+
+
+@lru_cache(maxsize=1)
+def get_retriever(k=None):
+    """
+    Builds the retriever configured by `settings.RETRIEVER_SEARCH_TYPE`.
+
+    Args:
+        k (int): Number of documents retrieved, `settings.RETRIEVER_K` by default.
+
+    Returns:
+        BaseRetriever: The retriever.
+    """
+    k = k or settings.RETRIEVER_K
+    if settings.RETRIEVER_SEARCH_TYPE == "local":
+        return LocalRetriever(index=get_local_index(), graph=get_neo4j_graph(), embeddings=get_embeddings(), k=k)
+    if settings.RETRIEVER_SEARCH_TYPE != "hybrid":
+        return get_vector_store().as_retriever(search_kwargs={"k": k})
+
+    ensure_schema()
+    return HybridRetriever(
+        graph=get_neo4j_graph(), embeddings=get_embeddings(), k=k, fetch_k=max(k, settings.RETRIEVER_FETCH_K)
+    )
+
 
-retriever = neo4j_vector_store.as_retriever()
+def get_scoped_retriever(document_ids, k=None):
+    """
+    Builds a retriever restricted to the chunks of the given documents.
+
+    Scoped searches use the local index when it is the configured backend and
+    otherwise the hybrid Cypher query, with the keyword weight as configured,
+    since the plain vector index cannot be prefiltered.
+
+    Args:
+        document_ids (list): Ids of the documents in scope.
+        k (int): Number of documents retrieved, `settings.RETRIEVER_K` by default.
+
+    Returns:
+        BaseRetriever: The scoped retriever.
+    """
+    k = k or settings.RETRIEVER_K
+    if settings.RETRIEVER_SEARCH_TYPE == "local":
+        return LocalRetriever(
+            index=get_local_index(), graph=get_neo4j_graph(), embeddings=get_embeddings(),
+            k=k, document_ids=list(document_ids)
+        )
+    ensure_schema()
+    return HybridRetriever(
+        graph=get_neo4j_graph(), embeddings=get_embeddings(), k=k, fetch_k=max(k, settings.RETRIEVER_FETCH_K),
+        document_ids=list(document_ids)
+    )
 
 qa_prompt = PromptTemplate(
     input_variables=["question", "context", "chat_history"],
@@ -30,7 +112,10 @@ qa_prompt = PromptTemplate(
 )
 
 
-qa_chain = qa_prompt | llm | StrOutputParser()
+# Chains tagged "answer" produce user-facing text and are streamed token by token
+@lru_cache(maxsize=1)
+def get_qa_chain():
+    return (qa_prompt | get_llm() | StrOutputParser()).with_config(tags=["answer"])
 
 fallback_prompt = ChatPromptTemplate.from_template(
     """
@@ -64,7 +149,11 @@ fallback_prompt = ChatPromptTemplate.from_template(
     """
 )
 
-fallback_chain = fallback_prompt | llm | StrOutputParser()
+
+@lru_cache(maxsize=1)
+def get_fallback_chain():
+    return (fallback_prompt | get_llm() | StrOutputParser()).with_config(tags=["answer"])
+
 
 class HallucinationEvaluator(BaseModel):
     """Binary score for hallucination present in generation answer."""
@@ -72,17 +161,19 @@ class HallucinationEvaluator(BaseModel):
     grade: str = Field(...,
         description="Answer is grounded in the facts, 'yes' or 'no'"
     )
-    
-hallucination_llm = llm.with_structured_output(HallucinationEvaluator)
+
 hallucination_prompt = ChatPromptTemplate.from_template(hallucination_prompt_template)
 
-hallucination_chain = hallucination_prompt | hallucination_llm
+
+@lru_cache(maxsize=1)
+def get_hallucination_chain():
+    return hallucination_prompt | get_llm().with_structured_output(HallucinationEvaluator)
+
 
 class AnswerabilityEvaluator(BaseModel):
     """Binary score for determining if a question is answerable using the provided documents."""
     grade: str = Field(..., description="Answer can be determined using the documents, 'yes' or 'no'")
 
-answerability_llm = llm.with_structured_output(AnswerabilityEvaluator)
 answerability_prompt_template = """
 You are tasked with determining if the documents explicitly provide the information needed to answer the following question.
 
@@ -96,24 +187,107 @@ Do not infer, assume, or provide any answers based on indirect information. Only
 
 
 answerability_prompt = ChatPromptTemplate.from_template(answerability_prompt_template)
-answerability_chain = answerability_prompt | answerability_llm
 
-def format_chat_history(messages):
+
+@lru_cache(maxsize=1)
+def get_answerability_chain():
+    return answerability_prompt | get_llm().with_structured_output(AnswerabilityEvaluator)
+
+
+warmup_status = {"vector_store": "pending", "error": None}
+
+
+def warm_up():
+    """
+    Bootstraps the Neo4j schema and builds the retriever and chains ahead of
+    the first request.
+
+    Failures are recorded in `warmup_status` instead of raised, the components
+    are built again on first use.
+    """
+    try:
+        ensure_schema()
+        # The same entry the retrieve node uses, the cache holds a single retriever
+        get_retriever(k=retrieval_k())
+        if settings.RETRIEVER_SEARCH_TYPE == "local":
+            get_local_index().maybe_sync(get_neo4j_graph())
+        get_qa_chain()
+        get_fallback_chain()
+        get_hallucination_chain()
+        get_answerability_chain()
+        warmup_status.update(vector_store="ready", error=None)
+    except Exception as e:
+        print(f"> ❌ \033[91mWarm-up failed: {e}\033[0m")
+        warmup_status.update(vector_store="failed", error=str(e))
+
+def format_chat_history(messages, token_budget=None):
     """
     Formats the chat history for inclusion in the prompt.
 
+    Retrieved context (ToolMessages) is left out, since every turn retrieves its
+    own. The most recent turns are kept until `token_budget` is spent, and
+    every turn is truncated to `settings.HISTORY_TURN_TOKENS`.
+
     Args:
         messages (list): A list of message objects (HumanMessage, ToolMessage, AIMessage).
+        token_budget (int): Maximum number of history tokens.
 
     Returns:
         str: Formatted chat history as a string.
     """
+    token_budget = token_budget or settings.HISTORY_TOKEN_BUDGET
     formatted_history = []
-    for message in messages:
+    used = 0
+    for message in reversed(messages):
         if isinstance(message, HumanMessage):
-            formatted_history.append(f"Human: {message.content}")
+            prefix = "Human"
         elif isinstance(message, AIMessage):
-            formatted_history.append(f"AI: {message.content}")
-        elif isinstance(message, ToolMessage):
-            formatted_history.append(f"Tool ({message.tool_name}): {message.content}")
-    return "\n".join(formatted_history)
+            prefix = "AI"
+        else:
+            continue
+        line = f"{prefix}: {truncate_tokens(message.content, settings.HISTORY_TURN_TOKENS)}"
+        tokens = count_tokens(line)
+        if used + tokens > token_budget:
+            break
+        formatted_history.append(line)
+        used += tokens
+    return "\n".join(reversed(formatted_history))
+
+
+def latest_question(messages):
+    """
+    Finds the question of the current turn.
+
+    Args:
+        messages (list): The messages of the thread.
+
+    Returns:
+        tuple: Index and content of the last HumanMessage, (len(messages), "") if there is none.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return index, messages[index].content
+    return len(messages), ""
+
+
+def trim_history(messages, max_messages=None):
+    """
+    Builds the removals that keep a thread's history within the configured cap.
+
+    The oldest messages are dropped first and the kept history always starts
+    at a human turn.
+
+    Args:
+        messages (list): The messages currently stored for the thread.
+        max_messages (int): Maximum number of messages to keep.
+
+    Returns:
+        list: RemoveMessage instances for the messages to drop.
+    """
+    max_messages = max_messages or settings.CHAT_HISTORY_MAX_MESSAGES
+    cutoff = max(0, len(messages) - max_messages)
+    while cutoff < len(messages) and not isinstance(messages[cutoff], HumanMessage):
+        cutoff += 1
+    if cutoff >= len(messages):
+        return []
+    return [RemoveMessage(id=message.id) for message in messages[:cutoff]]
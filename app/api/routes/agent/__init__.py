@@ -1,26 +1,148 @@
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+import json
+import math
+import time
+from typing import Optional
+from fastapi import APIRouter, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import RateLimitError
+from langchain_core.messages import HumanMessage, AIMessage
+from app.core.config import settings
 from app.models.chat import Chat
-from app.agent import graph
-import pprint
-from fastapi import HTTPException
+from app.agent import graph, NODE_NAMES
+from app.agent.cache import answer_cache
+from app.agent.context import TokenReport
+from app.agent.utils import get_embeddings
+from app.core.metrics import MetricsCallbackHandler, Trace, current_trace, record_stage, span
+from app.core.scheduler import SchedulerOverloaded, get_embedding_limiter, get_llm_limiter
 
 router = APIRouter()
 
+ANSWER_NODES = ("generate", "fallback")
+
+
+def _event_line(event: str, **fields) -> str:
+    return json.dumps({"event": event, **fields}) + "\n"
+
+
+def _busy_line(retry_after) -> str:
+    retry_after = max(1, math.ceil(retry_after))
+    return _event_line(
+        "error", content=f"The service is busy, please retry in {retry_after} seconds", retry_after=retry_after
+    )
+
+
+def _rate_limit_retry_after(error: RateLimitError) -> float:
+    try:
+        return float(error.response.headers.get("retry-after", 1))
+    except (AttributeError, TypeError, ValueError):
+        return 1.0
+
+
 @router.post("/chat")
-async def chat(chat: Chat):
+async def chat(chat: Chat, x_trace: Optional[str] = Header(None)):
+    """
+    Streams the agent answer as newline-delimited JSON events.
+
+    Events are `token` (a piece of the answer), `retract` (the answer streamed so
+    far was rejected by the hallucination grader and will be replaced by the
+    fallback answer), `usage` (prompt tokens per node), `error` and a final `end`
+    carrying the `thread_id`, generated when the request has none, to send with
+    the next questions of the conversation. It is also in the X-Thread-Id header.
+    When the request sets an `X-Trace` header, a `trace` event with the node
+    timings and LLM usage of the request is sent before `end`.
+
+    The request is rejected with a 503 when the OpenAI rate limits would keep
+    it waiting longer than `settings.SCHEDULER_MAX_WAIT_SECONDS`; a rate limit
+    hit while streaming ends with an `error` event carrying `retry_after`.
+    """
+    wait = max(get_llm_limiter().estimated_wait(), get_embedding_limiter().estimated_wait())
+    if wait > settings.SCHEDULER_MAX_WAIT_SECONDS:
+        retry_after = math.ceil(wait)
+        return JSONResponse(
+            status_code=503,
+            content={"error": f"The service is busy, please retry in {retry_after} seconds", "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    token_report = TokenReport()
+    trace = Trace()
+    config = {
+        "configurable": {
+            "thread_id": chat.thread_id,
+            "document_ids": chat.document_ids,
+            "token_report": token_report,
+            "recursion_limit": 3
+        },
+        "callbacks": [MetricsCallbackHandler(NODE_NAMES, trace)],
+    }
+    scope = frozenset(chat.document_ids) if chat.document_ids else None
+
     async def token_stream():
+        started = time.perf_counter()
+        # Spans recorded anywhere while answering belong to this request's trace
+        trace_token = current_trace.set(trace)
+        query_vector = None
         try:
-            events = list(graph.stream({'messages': chat.message}, config={"configurable": {"thread_id": "1", "recursion_limit": 3}}))
-            for event in events:
-                if 'fallback' in event and 'messages' in event['fallback']:
-                    yield event['fallback']['messages'][0].content
-                elif 'generate' in event and 'messages' in event['generate']:
-                    yield event['generate']['messages'][0].content
-                else:
-                    print("Not in generation nodes")
-                    print(event)
+            cached = None
+            if settings.ANSWER_CACHE_ENABLED:
+                # A follow-up depends on its conversation, only opening questions are cached
+                state = await graph.aget_state(config)
+                if not state.values.get("messages"):
+                    with span("chat.cache_lookup"):
+                        query_vector = await get_embeddings().aembed_query(chat.message)
+                        cached = answer_cache.lookup(query_vector, scope)
+
+            if cached is not None:
+                # Keep the thread history consistent with a regular graph run
+                await graph.aupdate_state(
+                    config,
+                    {"messages": [HumanMessage(content=chat.message), AIMessage(content=cached)]},
+                    as_node="fallback"
+                )
+                answer_cache.record(True, time.perf_counter() - started)
+                yield _event_line("token", node="cache", content=cached)
+            else:
+                generation = []
+                async for event in graph.astream_events({'messages': chat.message}, config=config, version="v2"):
+                    node = event.get("metadata", {}).get("langgraph_node")
+                    if event["event"] == "on_chat_model_stream" and node in ANSWER_NODES and "answer" in event.get("tags", []):
+                        content = event["data"]["chunk"].content
+                        if content:
+                            if node == "generate":
+                                generation.append(content)
+                            yield _event_line("token", node=node, content=content)
+                    elif event["event"] == "on_chain_start" and event["name"] == "fallback" and node == "fallback":
+                        if generation:
+                            yield _event_line("retract", node="generate")
+                            generation = []
+
+                yield _event_line("usage", **token_report.as_dict())
+
+                # A generation still standing at the end passed the hallucination grader
+                if query_vector is not None:
+                    if generation:
+                        answer_cache.store(query_vector, "".join(generation), scope)
+                    answer_cache.record(False, time.perf_counter() - started)
+        except SchedulerOverloaded as e:
+            yield _busy_line(e.retry_after)
+        except RateLimitError as e:
+            yield _busy_line(_rate_limit_retry_after(e))
         except Exception as e:
-            yield f"Error: {str(e)}\n" 
+            yield _event_line("error", content=str(e))
+        finally:
+            current_trace.reset(trace_token)
+        record_stage("chat.total", time.perf_counter() - started, trace)
+        if x_trace:
+            yield _event_line("trace", **trace.as_dict())
+        yield _event_line("end", thread_id=chat.thread_id)
+
+    return StreamingResponse(
+        token_stream(),
+        media_type="application/x-ndjson",
+        headers={"X-Trace-Id": trace.trace_id, "X-Thread-Id": chat.thread_id}
+    )
+
 
-    return StreamingResponse(token_stream(), media_type="text/plain")
+@router.get("/cache")
+def cache_metrics():
+    return answer_cache.metrics()
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.agent.utils import warmup_status
+
+router = APIRouter()
+
+@router.get("")
+def health():
+    """
+    Readiness of the app: 200 "ok" once every component warmed up, otherwise
+    503 "degraded" while a component is still pending or failed.
+    """
+    ready = all(state == "ready" for component, state in warmup_status.items() if component != "error")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ok" if ready else "degraded", "components": warmup_status}
+    )
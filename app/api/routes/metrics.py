@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.agent.cache import answer_cache
+from app.core.metrics import render_prometheus
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    cache = answer_cache.metrics()
+    return render_prometheus({
+        "pdf_agent_answer_cache_entries": cache["entries"],
+        "pdf_agent_answer_cache_hits": cache["hits"],
+        "pdf_agent_answer_cache_misses": cache["misses"],
+        "pdf_agent_answer_cache_saved_llm_calls": cache["saved_llm_calls"],
+    })
@@ -1,120 +1,146 @@
-from fastapi import APIRouter, File, UploadFile, Form, Depends, Response
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_openai.embeddings import OpenAIEmbeddings
-import os, hashlib, shutil
+import asyncio
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, File, UploadFile, Form, Depends, Response, HTTPException
 from app.core.config import settings
-from app.core.database.neo4j import get_neo4j_graph
+from app.core.database.neo4j import run_query
+from app.rag.ingestion import find_ingested_document, replace_previous_version
+from app.rag.jobs import submit_ingestion, get_job, create_batch, get_batch, queued_count
+from app.rag.storage import save_upload, save_zip_upload, extract_pdfs, is_zip_upload
 
 router = APIRouter()
 
+
+def reject_when_backlogged():
+    """
+    Sheds uploads while `settings.INGEST_MAX_QUEUED` jobs are already waiting for a worker.
+
+    Raises:
+        HTTPException: 503 with a Retry-After header when the queue is full.
+    """
+    if queued_count() >= settings.INGEST_MAX_QUEUED:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many documents are waiting to be ingested, please retry later",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
+        )
+
+
+async def queue_document(filename, document_id, file_path, replaces=None):
+    """
+    Queues a stored pdf for ingestion unless it was already ingested, in which
+    case only the version it replaces is deleted.
+
+    Args:
+        replaces (str): Id of the previous version of the document, deleted once this one is stored.
+
+    Returns:
+        dict: The filename, document id and the job id and status, or the 'Already ingested' status.
+    """
+    ingested = await find_ingested_document(document_id)
+    if ingested:
+        if replaces:
+            await asyncio.to_thread(replace_previous_version, document_id, replaces)
+        return {'filename': ingested['filename'], 'document_id': document_id, 'status': 'Already ingested'}
+
+    job = submit_ingestion(file_path, filename, document_id, replaces)
+    return {'filename': filename, 'document_id': document_id, 'job_id': job.job_id, 'status': job.status}
+
+
 @router.post('/upload')
 async def upload_document(
     file: UploadFile = File(...),
+    replaces: Optional[str] = Form(None),
     ):
+    """
+    Uploads a pdf file. A new version of a document sets `replaces` to the
+    document id of the version it replaces, which is deleted once the new
+    version is ingested.
+    """
+    reject_when_backlogged()
     try:
         if file.content_type != 'application/pdf':
             return {'error': 'The file must be pdf'}
-        file_path = os.path.join(settings.RAG_UPLOAD_DIR, file.filename)
-
-        if not os.path.isdir(settings.RAG_UPLOAD_DIR):
-            os.makedirs(settings.RAG_UPLOAD_DIR, exist_ok=True)
-        file_hash = hashlib.sha256()
-        with open(file_path, 'wb') as file_buffer:
-            shutil.copyfileobj(file.file, file_buffer)
-            while True:
-                chunk = await file.read(1024)  # Read in chunks of 1024 bytes
-                if not chunk:
-                    break
-                file_hash.update(chunk)
-        pdf_loader = PyPDFLoader(file_path)
-        pages = pdf_loader.load()
-        
-        print(f"generating chunks in {len(pages)} pages")
-
-        text_splitter = SemanticChunker(
-            OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL),
-            sentence_split_regex ='(?<=[.? !])\\s+'
-        )
-        chunks = text_splitter.split_documents(pages)
-
-        graphdb = get_neo4j_graph()
-        document_id = file_hash.hexdigest()
-        graphdb.query(
-            '''
-            MERGE (d:Document {documentId: $document_id, name: $name})
-            ''',
-            params={'document_id': document_id, 'name': file.filename}
-        )
-
-        graphdb.query(
-            '''
-            CREATE CONSTRAINT unique_chunk IF NOT EXISTS
-            FOR (c:Chunk) REQUIRE c.chunkId IS UNIQUE
-            '''
-        )
+        document_id, file_path = await save_upload(file)
+        return await queue_document(file.filename, document_id, file_path, replaces)
 
-        graphdb.query(
-            '''
-            CREATE VECTOR INDEX `embeddingChunks` IF NOT EXISTS
-            FOR (c:Chunk) ON (c.textEmbedding)
-            OPTIONS { indexConfig: {
-                    `vector.dimensions`: 1536,
-                    `vector.similarity_function`: 'cosine'
-                } 
-            }
-            '''
-        )
+    except Exception as e:
+        # Handle any other errors
+        print(f"An unexpected error occurred: {e}")
+        return {"error": f"An unexpected error occurred: {str(e)}"}
 
-        for i, chunk in enumerate(chunks):
-            chunk_id = f'{file.filename}_{i}'
-            graphdb.query(
-                '''
-                MERGE (c:Chunk {chunkId: $chunk_id}) ON CREATE SET c.text = $chunk
-                WITH c MATCH (d:Document {documentId: $document_id}) MERGE (d)-[:HAS_CHUNK]-(c)
-                ''',
-                params={
-                    'document_id': document_id, 
-                    'chunk_id': chunk_id, 
-                    'chunk': chunk.page_content
-                }
-            )
-        
-            graphdb.query("""
-            MATCH (d:Document {documentId: $document_id})-[:HAS_CHUNK]->(chunk:Chunk) WHERE chunk.textEmbedding IS NULL
-            WITH chunk, genai.vector.encode(
-            chunk.text, 
-            "OpenAI", 
-            {
-                token: $openAiApiKey,
-                model: $openAiEmbeddingModel,
-                endpoint: $openAiEndpoint
-            }) AS vector
-            CALL db.create.setNodeVectorProperty(chunk, "textEmbedding", vector)
-            """, 
-            params={
-                'document_id': document_id,
-                'openAiApiKey': settings.OPENAI_API_KEY,
-                'openAiEndpoint': settings.OPENAI_EMBEDDINGS_URI,
-                'openAiEmbeddingModel': settings.OPENAI_EMBEDDING_MODEL
-            }
-        )
 
-        return {'filename': file.filename, 'document_id': document_id, 'status': 'Uploaded successfully'}
+@router.post('/bulk')
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    ):
+    """
+    Uploads many pdf files at once, given separately or as zip archives.
+
+    Every file is queued as soon as it is on disk, so the first documents are
+    ingested while the rest are still being stored. Failures are reported per
+    file and do not stop the others. Files over `settings.BULK_MAX_FILE_BYTES`
+    are rejected, whether sent directly or inside an archive. The upload is rejected with a 503 while
+    the ingestion queue is full, an accepted upload is queued in full.
+    """
+    reject_when_backlogged()
+    try:
+        results = []
+        for file in files:
+            if len(results) >= settings.BULK_MAX_FILES:
+                results.append({'filename': file.filename, 'status': 'failed', 'error': 'Too many files'})
+                continue
+            try:
+                if is_zip_upload(file):
+                    archive_path = await save_zip_upload(file)
+                    try:
+                        stored = await asyncio.to_thread(
+                            extract_pdfs, archive_path, file.filename, settings.BULK_MAX_FILES - len(results)
+                        )
+                    finally:
+                        os.remove(archive_path)
+                elif file.content_type == 'application/pdf':
+                    document_id, file_path = await save_upload(file, settings.BULK_MAX_FILE_BYTES)
+                    stored = [{'filename': file.filename, 'document_id': document_id, 'file_path': file_path}]
+                else:
+                    stored = [{'filename': file.filename, 'error': 'The file must be pdf or zip'}]
+            except Exception as e:
+                stored = [{'filename': file.filename, 'error': str(e)}]
+
+            for entry in stored:
+                if 'error' in entry:
+                    results.append({**entry, 'status': 'failed'})
+                else:
+                    results.append(await queue_document(entry['filename'], entry['document_id'], entry['file_path']))
+
+        return {'batch_id': create_batch(results), 'files': results}
 
     except Exception as e:
-        # Handle any other errors
         print(f"An unexpected error occurred: {e}")
         return {"error": f"An unexpected error occurred: {str(e)}"}
 
+
+@router.get('/bulk/{batch_id}')
+def get_bulk_upload(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@router.get('/jobs/{job_id}')
+def get_ingestion_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get('/')
-def list_documents():
+async def list_documents():
     try:
-        graphdb = get_neo4j_graph()
-
-        result = graphdb.query(
+        result = await run_query(
             '''
-            MATCH (d:Document)
+            MATCH (d:Document) WHERE d.ingested = true
             RETURN d.documentId AS document_id, d.name AS filename
             '''
         )
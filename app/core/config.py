@@ -9,17 +9,95 @@ class Settings(BaseModel):
     NEO4J_USERNAME: str = os.getenv('NEO4J_USERNAME', "")
     NEO4J_PASSWORD: str = os.getenv('NEO4J_PASSWORD', "")
     NEO4J_DATABASE: str = os.getenv('NEO4J_DATABASE', "")
+    NEO4J_MAX_POOL_SIZE: int = int(os.getenv('NEO4J_MAX_POOL_SIZE', 50))
+    NEO4J_ACQUISITION_TIMEOUT: float = float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', 30.0))
+    NEO4J_MAX_RETRY_TIME: float = float(os.getenv('NEO4J_MAX_RETRY_TIME', 15.0))
 
     VECTOR_INDEX_NAME: str = 'ChunkEmbedding'
     VECTOR_DOCUMENT_NODE: str = 'Document'
-    VECTOR_CHUNK_NODE: str = 'Chubk'
+    VECTOR_CHUNK_NODE: str = 'Chunk'
     VECTOR_SOURCE_PROPERTY: str = 'text'
     VECTOR_EMBEDDING_PROPERTY: str = 'textEmbedding'
+    KEYWORD_INDEX_NAME: str = 'ChunkText'
+
+    RETRIEVER_SEARCH_TYPE: str = os.getenv('RETRIEVER_SEARCH_TYPE', 'hybrid')
+    RETRIEVER_K: int = int(os.getenv('RETRIEVER_K', 4))
+    RETRIEVER_FETCH_K: int = int(os.getenv('RETRIEVER_FETCH_K', 20))
+    RETRIEVER_SCOPED_OVERFETCH: int = int(os.getenv('RETRIEVER_SCOPED_OVERFETCH', 5))
+    RRF_K: int = int(os.getenv('RRF_K', 60))
+    RRF_VECTOR_WEIGHT: float = float(os.getenv('RRF_VECTOR_WEIGHT', 1.0))
+    RRF_KEYWORD_WEIGHT: float = float(os.getenv('RRF_KEYWORD_WEIGHT', 1.0))
+    RERANKER: str = os.getenv('RERANKER', 'bm25')
+    RERANKER_MODEL: str = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_FETCH_K: int = int(os.getenv('RERANK_FETCH_K', 20))
+    RERANK_WEIGHT: float = float(os.getenv('RERANK_WEIGHT', 0.5))
+    RERANK_MIN_K: int = int(os.getenv('RERANK_MIN_K', 1))
+    RERANK_SCORE_GAP: float = float(os.getenv('RERANK_SCORE_GAP', 0.25))
+    LOCAL_INDEX_PATH: str = os.getenv('LOCAL_INDEX_PATH', os.path.join(APP_BASE_DIR, "cache", "local_index"))
+    LOCAL_INDEX_SYNC_SECONDS: float = float(os.getenv('LOCAL_INDEX_SYNC_SECONDS', 30.0))
+    LOCAL_INDEX_IVF_MIN_CHUNKS: int = int(os.getenv('LOCAL_INDEX_IVF_MIN_CHUNKS', 50000))
+    LOCAL_INDEX_NPROBE: int = int(os.getenv('LOCAL_INDEX_NPROBE', 8))
+
+    UPLOAD_READ_SIZE: int = 1024 * 1024
+
+    INGEST_BATCH_SIZE: int = int(os.getenv('INGEST_BATCH_SIZE', 500))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv('EMBEDDING_BATCH_SIZE', 1000))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_CACHE_PATH: str = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(APP_BASE_DIR, "cache", "embeddings.sqlite"))
+    EMBEDDING_CACHE_LRU_SIZE: int = int(os.getenv('EMBEDDING_CACHE_LRU_SIZE', 10000))
+    CHUNK_BREAKPOINT_PERCENTILE: float = float(os.getenv('CHUNK_BREAKPOINT_PERCENTILE', 95))
+    CHUNK_MAX_TOKENS: int = int(os.getenv('CHUNK_MAX_TOKENS', 512))
+    CHUNK_MIN_TOKENS: int = int(os.getenv('CHUNK_MIN_TOKENS', 64))
+    CHUNK_EMBEDDING_CONCURRENCY: int = int(os.getenv('CHUNK_EMBEDDING_CONCURRENCY', 4))
+    INGEST_PAGE_WINDOW: int = int(os.getenv('INGEST_PAGE_WINDOW', 20))
+    PARSE_WORKERS: int = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+    PARSE_BATCH_SIZE: int = int(os.getenv('PARSE_BATCH_SIZE', 8))
+    INGEST_WORKERS: int = int(os.getenv('INGEST_WORKERS', 2))
+    INGEST_JOB_HISTORY: int = int(os.getenv('INGEST_JOB_HISTORY', 1000))
+    INGEST_WRITE_CONCURRENCY: int = int(os.getenv('INGEST_WRITE_CONCURRENCY', 4))
+    INGEST_MAX_QUEUED: int = int(os.getenv('INGEST_MAX_QUEUED', 100))
+    INGEST_RETRY_AFTER_SECONDS: int = int(os.getenv('INGEST_RETRY_AFTER_SECONDS', 30))
+    BULK_MAX_FILES: int = int(os.getenv('BULK_MAX_FILES', 1000))
+    BULK_MAX_FILE_BYTES: int = int(os.getenv('BULK_MAX_FILE_BYTES', 200 * 1024 * 1024))
+
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv('HISTORY_TOKEN_BUDGET', 1000))
+    HISTORY_TURN_TOKENS: int = int(os.getenv('HISTORY_TURN_TOKENS', 200))
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', 20))
+    CHECKPOINT_BACKEND: str = os.getenv('CHECKPOINT_BACKEND', 'memory')
+    CHECKPOINT_SQLITE_PATH: str = os.getenv('CHECKPOINT_SQLITE_PATH', os.path.join(APP_BASE_DIR, "checkpoints.sqlite"))
+    CHECKPOINT_MAX_THREADS: int = int(os.getenv('CHECKPOINT_MAX_THREADS', 1000))
+    CHECKPOINT_TTL_SECONDS: int = int(os.getenv('CHECKPOINT_TTL_SECONDS', 86400))
+    CHECKPOINT_MAX_PER_THREAD: int = int(os.getenv('CHECKPOINT_MAX_PER_THREAD', 4))
+
+    SPECULATIVE_GENERATION: bool = os.getenv('SPECULATIVE_GENERATION', 'false').lower() == 'true'
+
+    ANSWER_CACHE_ENABLED: bool = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_SIZE: int = int(os.getenv('ANSWER_CACHE_SIZE', 1000))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+
+    GRADE_CACHE_ENABLED: bool = os.getenv('GRADE_CACHE_ENABLED', 'true').lower() == 'true'
+    GRADE_CACHE_PATH: str = os.getenv('GRADE_CACHE_PATH', os.path.join(APP_BASE_DIR, "cache", "grades.sqlite"))
+    GRADE_CACHE_TTL_SECONDS: int = int(os.getenv('GRADE_CACHE_TTL_SECONDS', 3600))
+    GROUNDING_OVERLAP_THRESHOLD: float = float(os.getenv('GROUNDING_OVERLAP_THRESHOLD', 0.9))
+    GROUNDING_MIN_TERMS: int = int(os.getenv('GROUNDING_MIN_TERMS', 5))
 
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_CHAT_MODEL: str = "gpt-4o-mini"
     OPENAI_EMBEDDINGS_URI: str = "https://api.openai.com/v1/embeddings"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # 0 derives the dimensions from the embedding model
+    EMBEDDING_DIMENSIONS: int = int(os.getenv('EMBEDDING_DIMENSIONS', 0))
+
+    # Account rate limits shared by every call, 0 disables a limit
+    OPENAI_CHAT_RPM: int = int(os.getenv('OPENAI_CHAT_RPM', 500))
+    OPENAI_CHAT_TPM: int = int(os.getenv('OPENAI_CHAT_TPM', 200000))
+    OPENAI_EMBEDDING_RPM: int = int(os.getenv('OPENAI_EMBEDDING_RPM', 3000))
+    OPENAI_EMBEDDING_TPM: int = int(os.getenv('OPENAI_EMBEDDING_TPM', 1000000))
+    LLM_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv('LLM_OUTPUT_TOKENS_ESTIMATE', 512))
+    SCHEDULER_INTERACTIVE_RESERVE: float = float(os.getenv('SCHEDULER_INTERACTIVE_RESERVE', 0.2))
+    SCHEDULER_MAX_WAIT_SECONDS: float = float(os.getenv('SCHEDULER_MAX_WAIT_SECONDS', 10.0))
+    EMBEDDING_COALESCE_SECONDS: float = float(os.getenv('EMBEDDING_COALESCE_SECONDS', 0.005))
 
 settings = Settings()
 
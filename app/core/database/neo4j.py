@@ -1,5 +1,6 @@
 from app.core.config import settings
 from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncGraphDatabase, RoutingControl
 from functools import lru_cache
 
 @lru_cache(maxsize=1)
@@ -9,4 +10,46 @@ def get_neo4j_graph():
         username=settings.NEO4J_USERNAME, 
         password=settings.NEO4J_PASSWORD, 
         database=settings.NEO4J_DATABASE
-    )
\ No newline at end of file
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_driver():
+    return AsyncGraphDatabase.driver(
+        settings.NEO4J_URI,
+        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD),
+        max_connection_pool_size=settings.NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT,
+        max_transaction_retry_time=settings.NEO4J_MAX_RETRY_TIME,
+    )
+
+
+async def run_query(query, params=None, write=False):
+    """
+    Runs a Cypher query on the pooled async driver.
+
+    The query runs in a managed transaction, so transient errors (deadlocks,
+    leader switches, unavailable connections) are retried by the driver for
+    up to `settings.NEO4J_MAX_RETRY_TIME` seconds.
+
+    Args:
+        query (str): The Cypher query.
+        params (dict): The query parameters.
+        write (bool): Whether the query writes, reads may be routed to any member.
+
+    Returns:
+        list: One dict per returned record.
+    """
+    records, _, _ = await get_async_driver().execute_query(
+        query,
+        params or {},
+        database_=settings.NEO4J_DATABASE or None,
+        routing_=RoutingControl.WRITE if write else RoutingControl.READ,
+    )
+    return [record.data() for record in records]
+
+
+async def close_async_driver():
+    if get_async_driver.cache_info().currsize:
+        await get_async_driver().close()
+        get_async_driver.cache_clear()
@@ -0,0 +1,104 @@
+from functools import lru_cache
+
+from app.core.config import settings
+from app.core.database.neo4j import get_neo4j_graph
+
+# Output size of the OpenAI embedding models, other models are probed once
+EMBEDDING_DIMENSIONS = {
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+    'text-embedding-ada-002': 1536,
+}
+
+
+def embedding_dimensions():
+    """
+    Returns:
+        int: Dimensions of the configured embedding model, `settings.EMBEDDING_DIMENSIONS` when set.
+    """
+    if settings.EMBEDDING_DIMENSIONS:
+        return settings.EMBEDDING_DIMENSIONS
+    if settings.OPENAI_EMBEDDING_MODEL in EMBEDDING_DIMENSIONS:
+        return EMBEDDING_DIMENSIONS[settings.OPENAI_EMBEDDING_MODEL]
+    from app.core.scheduler import ScheduledOpenAIEmbeddings
+    return len(ScheduledOpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL).embed_query("dimensions"))
+
+
+def align_vector_index(graphdb, dimensions):
+    """
+    Makes `settings.VECTOR_INDEX_NAME` the only vector index on the chunk embeddings.
+
+    Vector indexes on the same label and property under another name (such as
+    the `embeddingChunks` index older versions created during ingestion) are
+    dropped, so every write maintains a single index.
+
+    Args:
+        graphdb (Neo4jGraph): The graph database connection.
+        dimensions (int): Dimensions of the embedding model.
+    """
+    label, embedding_property = settings.VECTOR_CHUNK_NODE, settings.VECTOR_EMBEDDING_PROPERTY
+    indexes = graphdb.query(
+        '''
+        SHOW INDEXES YIELD name, type, labelsOrTypes, properties, options
+        WHERE type = 'VECTOR'
+        RETURN name, labelsOrTypes AS labels, properties, options
+        '''
+    )
+    for index in indexes:
+        if index['labels'] != [label] or index['properties'] != [embedding_property]:
+            continue
+        if index['name'] != settings.VECTOR_INDEX_NAME:
+            print(f"> 🔧 Dropping the duplicate vector index {index['name']}")
+            graphdb.query(f"DROP INDEX `{index['name']}` IF EXISTS")
+            continue
+        existing = (index['options'] or {}).get('indexConfig', {}).get('vector.dimensions')
+        if existing and existing != dimensions:
+            print(
+                f"> ❌ \033[91mThe vector index {index['name']} has {existing} dimensions but "
+                f"{settings.OPENAI_EMBEDDING_MODEL} produces {dimensions}, re-ingest the documents "
+                f"after dropping it\033[0m"
+            )
+
+    graphdb.query(
+        f'''
+        CREATE VECTOR INDEX `{settings.VECTOR_INDEX_NAME}` IF NOT EXISTS
+        FOR (c:{label}) ON (c.{embedding_property})
+        OPTIONS {{ indexConfig: {{
+                `vector.dimensions`: {int(dimensions)},
+                `vector.similarity_function`: 'cosine'
+            }}
+        }}
+        '''
+    )
+
+
+@lru_cache(maxsize=1)
+def ensure_schema():
+    """
+    Creates the indexes and constraints the app relies on, once per process.
+
+    Called at startup and before the first ingestion or search; later calls
+    return immediately. A failed attempt is not cached and runs again on the
+    next call.
+    """
+    graphdb = get_neo4j_graph()
+    graphdb.query(
+        f'''
+        CREATE INDEX document_id IF NOT EXISTS
+        FOR (d:{settings.VECTOR_DOCUMENT_NODE}) ON (d.documentId)
+        '''
+    )
+    graphdb.query(
+        f'''
+        CREATE CONSTRAINT unique_chunk IF NOT EXISTS
+        FOR (c:{settings.VECTOR_CHUNK_NODE}) REQUIRE c.chunkId IS UNIQUE
+        '''
+    )
+    graphdb.query(
+        f'''
+        CREATE FULLTEXT INDEX `{settings.KEYWORD_INDEX_NAME}` IF NOT EXISTS
+        FOR (c:{settings.VECTOR_CHUNK_NODE}) ON EACH [c.{settings.VECTOR_SOURCE_PROPERTY}]
+        '''
+    )
+    align_vector_index(graphdb, embedding_dimensions())
+    print("> 🗂️  Neo4j schema ready")
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+
+# Keeps the number of bound parameters of a lookup below SQLite's limit
+SQLITE_BATCH_SIZE = 500
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding cache keyed by (model, sha256(text)).
+
+    Vectors are stored as float32 blobs in SQLite, with an in-process LRU of
+    `lru_size` entries in front of it.
+    """
+
+    def __init__(self, path, lru_size=10000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self._conn.commit()
+        self._lock = Lock()
+        self._lru = OrderedDict()
+        self.lru_size = lru_size
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model, hashes):
+        """
+        Looks up cached vectors.
+
+        Args:
+            model (str): Name of the embedding model.
+            hashes (list): Text hashes to look up.
+
+        Returns:
+            dict: The cached vectors by hash, misses are left out.
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for text_hash in hashes:
+                vector = self._lru.get((model, text_hash))
+                if vector is None:
+                    missing.append(text_hash)
+                else:
+                    self._lru.move_to_end((model, text_hash))
+                    found[text_hash] = vector
+            for start in range(0, len(missing), SQLITE_BATCH_SIZE):
+                batch = missing[start:start + SQLITE_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember((model, text_hash), vector)
+                    found[text_hash] = vector
+        return found
+
+    def put_many(self, model, vectors):
+        """
+        Stores vectors in the LRU and in SQLite.
+
+        Args:
+            model (str): Name of the embedding model.
+            vectors (dict): Vectors by text hash.
+        """
+        with self._lock:
+            for text_hash, vector in vectors.items():
+                self._remember((model, text_hash), vector)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [
+                    (model, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for text_hash, vector in vectors.items()
+                ]
+            )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends cache misses to the provider.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, store: EmbeddingStore):
+        self.underlying = underlying
+        self.model = model
+        self.store = store
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _lookup(self, texts):
+        hashes = [self._hash(text) for text in texts]
+        vectors = self.store.get_many(self.model, list(dict.fromkeys(hashes)))
+        misses = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                misses.setdefault(text_hash, text)
+        return hashes, vectors, misses
+
+    def _store(self, hashes, vectors, misses, embedded):
+        new_vectors = dict(zip(misses.keys(), embedded))
+        self.store.put_many(self.model, new_vectors)
+        vectors.update(new_vectors)
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_documents(self, texts):
+        hashes, vectors, misses = self._lookup(texts)
+        embedded = self.underlying.embed_documents(list(misses.values())) if misses else []
+        return self._store(hashes, vectors, misses, embedded)
+
+    async def aembed_documents(self, texts):
+        # Misses go through the provider's async path, and its async rate limiting
+        hashes, vectors, misses = self._lookup(texts)
+        embedded = await self.underlying.aembed_documents(list(misses.values())) if misses else []
+        return self._store(hashes, vectors, misses, embedded)
+
+    def embed_query(self, text):
+        text_hash = self._hash(text)
+        cached = self.store.get_many(self.model, [text_hash])
+        if text_hash in cached:
+            return cached[text_hash]
+        vector = self.underlying.embed_query(text)
+        self.store.put_many(self.model, {text_hash: vector})
+        return vector
+
+    async def aembed_query(self, text):
+        text_hash = self._hash(text)
+        cached = self.store.get_many(self.model, [text_hash])
+        if text_hash in cached:
+            return cached[text_hash]
+        vector = await self.underlying.aembed_query(text)
+        self.store.put_many(self.model, {text_hash: vector})
+        return vector
+
+
+@lru_cache(maxsize=1)
+def get_embedding_store():
+    return EmbeddingStore(settings.EMBEDDING_CACHE_PATH, lru_size=settings.EMBEDDING_CACHE_LRU_SIZE)
+
+
+def with_embedding_cache(embeddings: Embeddings, model: str):
+    """
+    Wraps an embedding model with the shared local cache when it is enabled.
+
+    Args:
+        embeddings (Embeddings): The provider embeddings.
+        model (str): Name of the embedding model, part of the cache key.
+
+    Returns:
+        Embeddings: The cached embeddings, or `embeddings` if caching is disabled.
+    """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, model, get_embedding_store())
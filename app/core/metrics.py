@@ -0,0 +1,210 @@
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels((*key, ('le', bound)))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram("pdf_agent_stage_seconds", "Duration of graph nodes and ingestion stages.")
+llm_calls = Counter("pdf_agent_llm_calls_total", "LLM calls by graph node.")
+llm_tokens = Counter("pdf_agent_llm_tokens_total", "LLM tokens by graph node and direction.")
+grader_verdicts = Counter("pdf_agent_grader_verdicts_total", "Grader verdicts by grader and source (llm, cache or heuristic).")
+
+REGISTRY = [stage_seconds, llm_calls, llm_tokens, grader_verdicts]
+
+
+class Trace:
+    """
+    Timing spans and LLM usage collected for a single request or ingestion job.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.llm = {}
+        self._lock = Lock()
+
+    def add_span(self, stage, seconds):
+        with self._lock:
+            self.spans.append({'stage': stage, 'seconds': seconds})
+
+    def add_llm_call(self, node, input_tokens, output_tokens):
+        with self._lock:
+            entry = self.llm.setdefault(node, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0})
+            entry['calls'] += 1
+            entry['input_tokens'] += input_tokens
+            entry['output_tokens'] += output_tokens
+
+    def totals(self):
+        """
+        Returns:
+            dict: Total seconds spent per stage.
+        """
+        with self._lock:
+            totals = {}
+            for span in self.spans:
+                totals[span['stage']] = totals.get(span['stage'], 0.0) + span['seconds']
+            return totals
+
+    def as_dict(self):
+        with self._lock:
+            return {'trace_id': self.trace_id, 'spans': list(self.spans), 'llm': dict(self.llm)}
+
+
+current_trace: ContextVar = ContextVar("current_trace", default=None)
+
+
+def record_stage(stage, seconds, trace=None):
+    stage_seconds.observe(seconds, stage=stage)
+    trace = trace or current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    """
+    Times a block and records it as `stage` in the metrics and the current trace.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def _token_usage(response):
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records graph node timings and LLM usage from LangChain callbacks.
+
+    Node and conditional edge runs are recognised by `node_names`; LLM calls
+    are attributed to the graph node they run in.
+    """
+
+    def __init__(self, node_names, trace=None):
+        self.node_names = set(node_names)
+        self.trace = trace
+        self._started = {}
+        self._llm_nodes = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        if kwargs.get('name') in self.node_names:
+            self._started[run_id] = (kwargs['name'], time.perf_counter())
+
+    def _end_chain(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started:
+            name, start = started
+            record_stage(f"graph.{name}", time.perf_counter() - start, self.trace)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_chain(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_chain(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._llm_nodes[run_id] = (metadata or {}).get('langgraph_node', 'unknown')
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._llm_nodes[run_id] = (metadata or {}).get('langgraph_node', 'unknown')
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node = self._llm_nodes.pop(run_id, 'unknown')
+        input_tokens, output_tokens = _token_usage(response)
+        llm_calls.inc(node=node)
+        llm_tokens.inc(input_tokens, node=node, type="input")
+        llm_tokens.inc(output_tokens, node=node, type="output")
+        if self.trace is not None:
+            self.trace.add_llm_call(node, input_tokens, output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_nodes.pop(run_id, None)
+
+
+def render_prometheus(extra_gauges=None):
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    Args:
+        extra_gauges (dict): Additional gauge values by metric name.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,387 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from threading import Condition, Lock
+from typing import Any, List
+
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from pydantic import PrivateAttr
+
+from app.core.config import settings
+from app.core.metrics import record_stage
+
+# Interactive chat calls are admitted before bulk ingestion calls
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+# OpenAI meters rate limits on an estimate of about four characters per token
+CHARS_PER_TOKEN = 4
+
+# Longest a waiter sleeps before checking the budgets again
+POLL_SECONDS = 0.05
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Raised when a call cannot be admitted within its timeout.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"The service is busy, please retry in {math.ceil(retry_after)} seconds")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Budget refilled continuously at `per_minute` units per minute, holding at most a minute's worth.
+
+    A non-positive `per_minute` disables the limit.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, reserve=0.0):
+        """
+        Returns:
+            float: Seconds until `amount` can be taken leaving `reserve` of the capacity untouched.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        floor = reserve * self.capacity
+        # Calls larger than the budget are admitted once it is full
+        amount = min(amount, self.capacity - floor)
+        return max(0.0, (amount + floor - self.level) / self.rate)
+
+    def drain_time(self, amount, reserve=0.0):
+        """
+        Returns:
+            float: Seconds until `amount` in total has been taken, possibly over several refills.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (amount + reserve * self.capacity - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.rate > 0:
+            self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Admits outbound calls in priority order within request and token budgets.
+
+    Waiting calls form a single queue ordered by priority, then arrival; only
+    the head may take from the budgets, so a bulk call never overtakes a
+    waiting interactive one. Bulk calls also leave `interactive_reserve` of
+    both budgets untouched, so interactive calls rarely wait behind a burst.
+    Sync callers block on a condition and async callers poll, both share the
+    same queue.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute, interactive_reserve=0.2):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.interactive_reserve = interactive_reserve
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = Condition(Lock())
+
+    def _reserve(self, priority):
+        return 0.0 if priority == PRIORITIES["interactive"] else self.interactive_reserve
+
+    def _try_admit(self, ticket):
+        """
+        Returns:
+            float: 0 when the call was admitted, otherwise an estimate of the seconds to wait.
+        """
+        if self._waiting[0] is not ticket:
+            return POLL_SECONDS
+        priority, _, requests, tokens = ticket
+        reserve = self._reserve(priority)
+        wait = max(self.requests.wait_time(requests, reserve), self.tokens.wait_time(tokens, reserve))
+        if wait > 0:
+            return wait
+        self.requests.take(requests)
+        self.tokens.take(tokens)
+        heapq.heappop(self._waiting)
+        self._condition.notify_all()
+        return 0.0
+
+    def _leave(self, ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._condition.notify_all()
+
+    def _ticket(self, priority, requests, tokens):
+        ticket = [PRIORITIES[priority], next(self._sequence), requests, tokens]
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _record(self, priority, started):
+        record_stage(f"scheduler.{self.name}.{priority}", time.monotonic() - started)
+
+    def acquire(self, priority, requests=1, tokens=0, timeout=None):
+        """
+        Blocks until the call is admitted.
+
+        Args:
+            priority (str): "interactive" or "bulk".
+            requests (int): Requests the call makes.
+            tokens (int): Estimated tokens the call consumes.
+            timeout (float): Longest wait in seconds, None waits as long as needed.
+
+        Raises:
+            SchedulerOverloaded: The call was not admitted within `timeout`.
+        """
+        started = time.monotonic()
+        with self._condition:
+            ticket = self._ticket(priority, requests, tokens)
+            try:
+                while (wait := self._try_admit(ticket)) > 0:
+                    if timeout is not None and time.monotonic() - started + wait > timeout:
+                        raise SchedulerOverloaded(self._estimated_wait(priority))
+                    self._condition.wait(min(wait, POLL_SECONDS))
+            except BaseException:
+                self._leave(ticket)
+                raise
+        self._record(priority, started)
+
+    async def aacquire(self, priority, requests=1, tokens=0, timeout=None):
+        """
+        Async version of `acquire`.
+        """
+        started = time.monotonic()
+        with self._condition:
+            ticket = self._ticket(priority, requests, tokens)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_admit(ticket)
+                if wait == 0:
+                    break
+                if timeout is not None and time.monotonic() - started + wait > timeout:
+                    raise SchedulerOverloaded(self.estimated_wait(priority))
+                await asyncio.sleep(min(wait, POLL_SECONDS))
+        except BaseException:
+            with self._condition:
+                self._leave(ticket)
+            raise
+        self._record(priority, started)
+
+    def estimated_wait(self, priority="interactive"):
+        """
+        Estimates how long a new call of `priority` would wait behind the calls queued ahead of it.
+
+        Returns:
+            float: The estimated wait in seconds.
+        """
+        with self._condition:
+            return self._estimated_wait(priority)
+
+    def _estimated_wait(self, priority):
+        level = PRIORITIES[priority]
+        ahead = [ticket for ticket in self._waiting if ticket[0] <= level]
+        requests = sum(ticket[2] for ticket in ahead) + 1
+        tokens = sum(ticket[3] for ticket in ahead)
+        reserve = self._reserve(level)
+        return max(self.requests.drain_time(requests, reserve), self.tokens.drain_time(tokens, reserve))
+
+    def queued(self):
+        with self._condition:
+            return len(self._waiting)
+
+
+@lru_cache(maxsize=1)
+def get_llm_limiter():
+    return RateLimiter(
+        "llm", settings.OPENAI_CHAT_RPM, settings.OPENAI_CHAT_TPM,
+        interactive_reserve=settings.SCHEDULER_INTERACTIVE_RESERVE
+    )
+
+
+@lru_cache(maxsize=1)
+def get_embedding_limiter():
+    return RateLimiter(
+        "embeddings", settings.OPENAI_EMBEDDING_RPM, settings.OPENAI_EMBEDDING_TPM,
+        interactive_reserve=settings.SCHEDULER_INTERACTIVE_RESERVE
+    )
+
+
+def estimate_tokens(texts):
+    return sum(len(text or "") for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def _timeout(priority):
+    # Bulk work waits as long as it takes, interactive calls give up and are shed
+    return settings.SCHEDULER_MAX_WAIT_SECONDS if priority == "interactive" else None
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose calls are admitted by the shared LLM rate limiter.
+
+    Calls are budgeted at the estimated prompt tokens plus `max_tokens`
+    (`settings.LLM_OUTPUT_TOKENS_ESTIMATE` when unset).
+    """
+
+    priority: str = "interactive"
+
+    def _cost(self, messages):
+        prompt = estimate_tokens(str(message.content) for message in messages)
+        return prompt + (self.max_tokens or settings.LLM_OUTPUT_TOKENS_ESTIMATE)
+
+    def _admit(self, messages):
+        get_llm_limiter().acquire(self.priority, tokens=self._cost(messages), timeout=_timeout(self.priority))
+
+    async def _aadmit(self, messages):
+        await get_llm_limiter().aacquire(self.priority, tokens=self._cost(messages), timeout=_timeout(self.priority))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit(messages)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await self._aadmit(messages)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        self._admit(args[0] if args else kwargs["messages"])
+        yield from super()._stream(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        await self._aadmit(args[0] if args else kwargs["messages"])
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+class QueryCoalescer:
+    """
+    Batches concurrent single-text embeddings into one request.
+
+    The first caller waits `window` seconds for others to join, then embeds
+    every distinct text at once; callers asking for a text already in flight
+    share its result. Async callers are batched per event loop by a task that
+    sleeps through the window and awaits `aembed_documents`, so they never
+    hold a thread while waiting.
+    """
+
+    def __init__(self, embed_documents, aembed_documents, window):
+        self.embed_documents = embed_documents
+        self.aembed_documents = aembed_documents
+        self.window = window
+        self._pending = {}
+        self._async_pending = {}
+        self._flushes = set()
+        self._lock = Lock()
+
+    def embed(self, text):
+        with self._lock:
+            future = self._pending.get(text)
+            leader = future is None and not self._pending
+            if future is None:
+                future = self._pending[text] = Future()
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            try:
+                for vector, waiter in zip(self.embed_documents(list(batch)), batch.values()):
+                    waiter.set_result(vector)
+            except Exception as e:
+                for waiter in batch.values():
+                    if not waiter.done():
+                        waiter.set_exception(e)
+        return future.result()
+
+    async def aembed(self, text):
+        """
+        Async version of `embed`.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pending = self._async_pending.setdefault(loop, {})
+            future = pending.get(text)
+            if future is None:
+                if not pending:
+                    flush = loop.create_task(self._aflush(loop))
+                    self._flushes.add(flush)
+                    flush.add_done_callback(self._flushes.discard)
+                future = pending[text] = loop.create_future()
+        # Shielded, a cancelled caller must not cancel the result other callers share
+        return await asyncio.shield(future)
+
+    async def _aflush(self, loop):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            with self._lock:
+                batch = self._async_pending.pop(loop, {})
+        try:
+            vectors = await self.aembed_documents(list(batch))
+            for vector, waiter in zip(vectors, batch.values()):
+                waiter.set_result(vector)
+        except BaseException as e:
+            for waiter in batch.values():
+                if not waiter.done():
+                    waiter.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+
+# Guards the lazy creation of the per-instance coalescers
+_coalescer_lock = Lock()
+
+
+class ScheduledOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    OpenAIEmbeddings whose requests are admitted by the shared embedding rate
+    limiter, with concurrent query embeddings coalesced into batches.
+    """
+
+    priority: str = "interactive"
+    _query_coalescer: Any = PrivateAttr(default=None)
+
+    def _cost(self, texts, chunk_size=None):
+        requests = math.ceil(len(texts) / (chunk_size or self.chunk_size)) or 1
+        return requests, estimate_tokens(texts)
+
+    def embed_documents(self, texts: List[str], chunk_size: Any = None) -> List[List[float]]:
+        requests, tokens = self._cost(texts, chunk_size)
+        get_embedding_limiter().acquire(self.priority, requests, tokens, timeout=_timeout(self.priority))
+        return super().embed_documents(texts, chunk_size)
+
+    async def aembed_documents(self, texts: List[str], chunk_size: Any = None) -> List[List[float]]:
+        requests, tokens = self._cost(texts, chunk_size)
+        await get_embedding_limiter().aacquire(self.priority, requests, tokens, timeout=_timeout(self.priority))
+        return await super().aembed_documents(texts, chunk_size)
+
+    def _coalescer(self):
+        # Owned by the instance, so it is released with it
+        with _coalescer_lock:
+            if self._query_coalescer is None:
+                self._query_coalescer = QueryCoalescer(
+                    self.embed_documents, self.aembed_documents, settings.EMBEDDING_COALESCE_SECONDS
+                )
+            return self._query_coalescer
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._coalescer().embed(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._coalescer().aembed(text)
@@ -1,6 +1,21 @@
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.main import api_router
+from app.api.routes import metrics
+from app.agent.utils import warm_up
+from app.core.database.neo4j import close_async_driver
 
-app = FastAPI()
 
-app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the worker starts serving right away
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    await close_async_driver()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.include_router(api_router, prefix="/api/v1")
+app.include_router(metrics.router)
@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+import uuid
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class Chat(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+    # A request without a thread starts a new conversation of its own
+    thread_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    document_ids: Optional[List[str]] = None
\ No newline at end of file
@@ -0,0 +1,16 @@
+from typing import Dict, Optional
+from pydantic import BaseModel
+
+class IngestionJob(BaseModel):
+    job_id: str
+    filename: str
+    document_id: str
+    replaces: Optional[str] = None
+    status: str = 'queued'
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_written: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    error: Optional[str] = None
+    timings: Dict[str, float] = {}
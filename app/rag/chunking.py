@@ -0,0 +1,169 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.agent.context import count_tokens, split_tokens
+from app.core.config import settings
+
+SENTENCE_SPLIT_REGEX = re.compile(r'(?<=[.?!])\s+')
+
+
+@lru_cache(maxsize=1)
+def get_embedding_executor():
+    return ThreadPoolExecutor(max_workers=settings.CHUNK_EMBEDDING_CONCURRENCY)
+
+
+def embed_in_batches(embeddings, texts, batch_size=None):
+    """
+    Embeds texts in requests of `batch_size`, with up to
+    `settings.CHUNK_EMBEDDING_CONCURRENCY` requests in flight.
+
+    Args:
+        embeddings (Embeddings): The embedding model.
+        texts (list): Texts to embed.
+        batch_size (int): Number of texts per request.
+
+    Returns:
+        np.ndarray: The L2-normalised embeddings, one row per text.
+    """
+    batch_size = max(1, batch_size or settings.EMBEDDING_BATCH_SIZE)
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    if len(batches) == 1:
+        vectors = embeddings.embed_documents(batches[0])
+    else:
+        vectors = [
+            vector
+            for batch in get_embedding_executor().map(embeddings.embed_documents, batches)
+            for vector in batch
+        ]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class StreamingSemanticChunker:
+    """
+    Semantic chunker over the whole page stream of a document.
+
+    Like SemanticChunker, every sentence is embedded together with its
+    neighbours and chunks break where the cosine distance between consecutive
+    sentences exceeds the `breakpoint_percentile` of the distances. Unlike it,
+    chunks can span pages: the last, still open chunk of every window is carried
+    over to the next one. Chunks are then packed to at most `max_tokens` tokens,
+    and chunks under `min_tokens` are merged with the following one when they fit.
+    Sentences over `max_tokens` on their own, such as tables or unpunctuated
+    text, are split on token boundaries first.
+    """
+
+    def __init__(self, embeddings, breakpoint_percentile=None, max_tokens=None, min_tokens=None):
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile or settings.CHUNK_BREAKPOINT_PERCENTILE
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        self.min_tokens = min_tokens if min_tokens is not None else settings.CHUNK_MIN_TOKENS
+        self._pending = []
+
+    def _sentences(self, pages):
+        sentences = []
+        for page in pages:
+            for text in SENTENCE_SPLIT_REGEX.split(page.page_content):
+                text = text.strip()
+                if not text:
+                    continue
+                tokens = count_tokens(text)
+                pieces = [text] if tokens <= self.max_tokens else split_tokens(text, self.max_tokens)
+                for piece in pieces:
+                    piece = piece.strip()
+                    if piece:
+                        sentences.append({
+                            'text': piece,
+                            'page': page.metadata.get('page'),
+                            'tokens': tokens if len(pieces) == 1 else count_tokens(piece),
+                            'vector': None
+                        })
+        return sentences
+
+    def _embed(self, sentences):
+        missing = [i for i, sentence in enumerate(sentences) if sentence['vector'] is None]
+        if not missing:
+            return
+        combined = [
+            " ".join(sentence['text'] for sentence in sentences[max(0, i - 1):i + 2])
+            for i in missing
+        ]
+        for i, vector in zip(missing, embed_in_batches(self.embeddings, combined)):
+            sentences[i]['vector'] = vector
+
+    def _groups(self, sentences):
+        if len(sentences) < 2:
+            return [list(range(len(sentences)))]
+        vectors = np.stack([sentence['vector'] for sentence in sentences])
+        distances = 1.0 - np.einsum('ij,ij->i', vectors[:-1], vectors[1:])
+        threshold = np.percentile(distances, self.breakpoint_percentile)
+        breakpoints = np.flatnonzero(distances > threshold) + 1
+        return [list(group) for group in np.split(np.arange(len(sentences)), breakpoints)]
+
+    def _pack(self, sentences, groups):
+        """
+        Splits groups over `max_tokens` and merges undersized groups forward.
+        """
+        chunks, current, tokens = [], [], 0
+        for group in groups:
+            for i in group:
+                sentence_tokens = sentences[i]['tokens']
+                # Plus one for the space joining the sentence to the chunk
+                if current and tokens + 1 + sentence_tokens > self.max_tokens:
+                    chunks.append(current)
+                    current, tokens = [], 0
+                tokens += sentence_tokens + (1 if current else 0)
+                current.append(i)
+            if tokens >= self.min_tokens:
+                chunks.append(current)
+                current, tokens = [], 0
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _documents(self, sentences, chunks):
+        return [
+            Document(
+                page_content=" ".join(sentences[i]['text'] for i in chunk),
+                metadata={'page': sentences[chunk[0]]['page']}
+            )
+            for chunk in chunks
+        ]
+
+    def split(self, pages):
+        """
+        Chunks the next pages of the document.
+
+        The last chunk may continue on the next pages, so its sentences are
+        kept for the next call and `flush` returns them once the document ends.
+
+        Args:
+            pages (list): The next pages, as Documents with a `page` metadata.
+
+        Returns:
+            list: The finished chunks, as Documents with the `page` they start on.
+        """
+        sentences = self._pending + self._sentences(pages)
+        if not sentences:
+            return []
+        self._embed(sentences)
+        chunks = self._pack(sentences, self._groups(sentences))
+        self._pending = [sentences[i] for i in chunks.pop()]
+        # The last sentence is embedded again with the next sentence as context
+        self._pending[-1] = dict(self._pending[-1], vector=None)
+        return self._documents(sentences, chunks)
+
+    def flush(self):
+        """
+        Returns:
+            list: The last chunk of the document, if any.
+        """
+        sentences, self._pending = self._pending, []
+        if not sentences:
+            return []
+        return self._documents(sentences, [list(range(len(sentences)))])
@@ -0,0 +1,334 @@
+import hashlib
+from collections import Counter
+from threading import BoundedSemaphore, Lock
+
+from app.agent.cache import answer_cache
+from app.agent.local_index import get_local_index
+from app.core.config import settings
+from app.core.database.neo4j import get_neo4j_graph, run_query
+from app.core.database.schema import ensure_schema
+from app.core.embedding_cache import with_embedding_cache
+from app.core.metrics import span
+from app.core.scheduler import ScheduledOpenAIEmbeddings
+from app.rag.chunking import StreamingSemanticChunker, get_embedding_executor
+from app.rag.parsing import iter_pages, iter_page_windows
+
+# Bounds the concurrent Neo4j write round trips of all running ingestions
+write_slots = BoundedSemaphore(settings.INGEST_WRITE_CONCURRENCY)
+
+# Ids of the documents queued or being ingested, never removed as a previous version
+_in_flight = Counter()
+_in_flight_lock = Lock()
+
+
+def begin_ingestion(document_id):
+    with _in_flight_lock:
+        _in_flight[document_id] += 1
+
+
+def end_ingestion(document_id):
+    with _in_flight_lock:
+        _in_flight[document_id] -= 1
+        if _in_flight[document_id] <= 0:
+            del _in_flight[document_id]
+
+
+def batched(items, batch_size):
+    """
+    Splits a list into consecutive batches.
+
+    Args:
+        items (list): Items to split.
+        batch_size (int): Maximum number of items per batch.
+
+    Returns:
+        generator: Lists of at most `batch_size` items.
+    """
+    batch_size = max(1, batch_size)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def content_hash(text):
+    """
+    Computes the content address of a piece of text.
+
+    Args:
+        text (str): The text to hash.
+
+    Returns:
+        str: Hex SHA-256 digest of the utf-8 encoded text.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+async def find_ingested_document(document_id):
+    """
+    Looks up a Document whose ingestion already completed.
+
+    Args:
+        document_id (str): Content hash of the uploaded file.
+
+    Returns:
+        dict | None: The document id and filename, or None if it was not ingested.
+    """
+    result = await run_query(
+        '''
+        MATCH (d:Document {documentId: $document_id}) WHERE d.ingested = true
+        RETURN d.documentId AS document_id, d.name AS filename
+        ''',
+        {'document_id': document_id}
+    )
+    return result[0] if result else None
+
+
+def find_embedded_chunks(graphdb, chunk_ids):
+    """
+    Finds which of the given chunks are already stored with an embedding.
+
+    Args:
+        graphdb (Neo4jGraph): The graph database connection.
+        chunk_ids (list): Content hashes of the chunks.
+
+    Returns:
+        set: Ids of the chunks that do not need to be embedded again.
+    """
+    result = graphdb.query(
+        '''
+        MATCH (c:Chunk) WHERE c.chunkId IN $chunk_ids AND c.textEmbedding IS NOT NULL
+        RETURN c.chunkId AS chunk_id
+        ''',
+        params={'chunk_ids': chunk_ids}
+    )
+    return {row['chunk_id'] for row in result}
+
+
+def remove_previous_versions(graphdb, document_id, replaces):
+    """
+    Deletes the version a document replaces and the chunks only it referenced.
+
+    Versions are linked explicitly by the uploader, documents sharing a
+    filename are unrelated. A version still being ingested is never deleted.
+
+    Args:
+        graphdb (Neo4jGraph): The graph database connection.
+        document_id (str): Id of the version to keep.
+        replaces (str): Id of the version to delete, None when the document is new.
+
+    Returns:
+        bool: True when the previous version was deleted.
+    """
+    if not replaces or replaces == document_id:
+        return False
+    # Held during the delete, so the old version cannot start ingesting meanwhile
+    with _in_flight_lock:
+        if replaces in _in_flight:
+            print(f"> ⏳ Keeping {replaces}, it is still being ingested")
+            return False
+        graphdb.query(
+            '''
+            MATCH (old:Document {documentId: $replaces})
+            OPTIONAL MATCH (old)-[:HAS_CHUNK]->(c:Chunk)
+            WITH collect(DISTINCT old) AS documents, collect(DISTINCT c) AS chunks
+            FOREACH (d IN documents | DETACH DELETE d)
+            WITH chunks UNWIND chunks AS c
+            WITH c WHERE NOT (c)<-[:HAS_CHUNK]-()
+            DETACH DELETE c
+            ''',
+            params={'replaces': replaces}
+        )
+    return True
+
+
+def replace_previous_version(document_id, replaces):
+    """
+    Deletes the version an already ingested document replaces, for uploads that skip ingestion.
+
+    Args:
+        document_id (str): Id of the ingested version to keep.
+        replaces (str): Id of the version to delete.
+
+    Returns:
+        bool: True when the previous version was deleted.
+    """
+    if not remove_previous_versions(get_neo4j_graph(), document_id, replaces):
+        return False
+    answer_cache.invalidate(replaces)
+    if settings.RETRIEVER_SEARCH_TYPE == "local":
+        get_local_index().mark_stale()
+    return True
+
+
+def embed_chunks(embeddings, chunks, batch_size=None, on_batch=None):
+    """
+    Computes the chunk embeddings client-side with batched `embed_documents` calls.
+
+    Args:
+        embeddings (Embeddings): The embedding model, usually the one used by the chunker.
+        chunks (list): A list of dicts with `chunk_id` and `text` keys.
+        batch_size (int): Number of texts sent per embedding request.
+        on_batch (callable): Called with the size of every embedded batch.
+
+    Returns:
+        list: The same chunks with an `embedding` key added.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    batches = list(batched(chunks, batch_size))
+    # Requests share the chunker's executor, which bounds them across ingestions
+    results = get_embedding_executor().map(
+        lambda batch: embeddings.embed_documents([chunk['text'] for chunk in batch]),
+        batches
+    )
+    for batch, vectors in zip(batches, results):
+        for chunk, vector in zip(batch, vectors):
+            chunk['embedding'] = vector
+        if on_batch:
+            on_batch(len(batch))
+    return chunks
+
+
+def write_chunks(graphdb, document_id, chunks, batch_size=None, on_batch=None):
+    """
+    Writes the chunks of a document, their HAS_CHUNK edges and embeddings with UNWIND batches.
+
+    Args:
+        graphdb (Neo4jGraph): The graph database connection.
+        document_id (str): Id of the parent Document node.
+        chunks (list): A list of dicts with `chunk_id`, `text`, `page`, `index` and optionally `embedding` keys.
+        batch_size (int): Number of chunks written per round trip.
+        on_batch (callable): Called with the size of every written batch.
+
+    Returns:
+        int: Number of chunks written.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    for batch in batched(chunks, batch_size):
+        with write_slots:
+            graphdb.query(
+                '''
+                MATCH (d:Document {documentId: $document_id})
+                UNWIND $chunks AS row
+                MERGE (c:Chunk {chunkId: row.chunk_id})
+                ON CREATE SET c.text = row.text, c.page = row.page, c.chunkIndex = row.index
+                MERGE (d)-[:HAS_CHUNK]->(c)
+                WITH c, row WHERE row.embedding IS NOT NULL
+                CALL db.create.setNodeVectorProperty(c, "textEmbedding", row.embedding)
+                ''',
+                params={'document_id': document_id, 'chunks': batch}
+            )
+        if on_batch:
+            on_batch(len(batch))
+    return len(chunks)
+
+
+def ingest_document(file_path, filename, document_id, job=None, replaces=None):
+    """
+    Parses, chunks, embeds and stores a pdf file in the graph database.
+
+    Args:
+        file_path (str): Path of the pdf file on disk.
+        filename (str): Original name of the uploaded file.
+        document_id (str): Id of the Document node.
+        job (IngestionJob): Optional job whose progress counters are updated.
+        replaces (str): Id of the previous version of the document, deleted once this one is stored.
+
+    Returns:
+        int: Number of chunks stored.
+    """
+    begin_ingestion(document_id)
+    try:
+        return _ingest_document(file_path, filename, document_id, job, replaces)
+    finally:
+        end_ingestion(document_id)
+
+
+def _ingest_document(file_path, filename, document_id, job, replaces):
+    embeddings = with_embedding_cache(
+        ScheduledOpenAIEmbeddings(
+            model=settings.OPENAI_EMBEDDING_MODEL,
+            chunk_size=settings.EMBEDDING_BATCH_SIZE,
+            priority="bulk"
+        ),
+        settings.OPENAI_EMBEDDING_MODEL
+    )
+    text_splitter = StreamingSemanticChunker(embeddings)
+
+    ensure_schema()
+    graphdb = get_neo4j_graph()
+    graphdb.query(
+        '''
+        MERGE (d:Document {documentId: $document_id, name: $name})
+        ''',
+        params={'document_id': document_id, 'name': filename}
+    )
+
+    def on_embedded(count):
+        if job:
+            job.chunks_embedded += count
+
+    def on_written(count):
+        if job:
+            job.chunks_written += count
+
+    # Pages are parsed, chunked, embedded and written one window at a time so
+    # only a window of the document is held in memory
+    seen_chunk_ids = set()
+    written = 0
+    windows = iter_page_windows(iter_pages(file_path))
+    parsed = False
+    while not parsed:
+        with span("ingest.parse"):
+            window = next(windows, None)
+        with span("ingest.chunk"):
+            if window is None:
+                # The chunk left open by the last window
+                parsed = True
+                chunks = text_splitter.flush()
+            else:
+                chunks = text_splitter.split(window)
+        if job and window:
+            job.pages_parsed += len(window)
+        if not chunks:
+            continue
+
+        # Chunks are content addressed, so unchanged chunks of a new version keep their id
+        chunk_rows = {}
+        for chunk in chunks:
+            chunk_id = content_hash(chunk.page_content)
+            if chunk_id not in seen_chunk_ids and chunk_id not in chunk_rows:
+                chunk_rows[chunk_id] = {
+                    'chunk_id': chunk_id,
+                    'text': chunk.page_content,
+                    'page': chunk.metadata.get('page'),
+                    'index': len(seen_chunk_ids) + len(chunk_rows)
+                }
+        chunk_rows = list(chunk_rows.values())
+        seen_chunk_ids.update(row['chunk_id'] for row in chunk_rows)
+
+        embedded = find_embedded_chunks(graphdb, [row['chunk_id'] for row in chunk_rows])
+        pending_rows = [row for row in chunk_rows if row['chunk_id'] not in embedded]
+        if job:
+            job.chunks_total += len(chunk_rows)
+            job.chunks_reused += len(embedded)
+
+        with span("ingest.embed"):
+            embed_chunks(embeddings, pending_rows, on_batch=on_embedded)
+        with span("ingest.write"):
+            written += write_chunks(graphdb, document_id, chunk_rows, on_batch=on_written)
+
+    print(f"stored {written} chunks of {filename}")
+
+    with span("ingest.cleanup"):
+        replaced = remove_previous_versions(graphdb, document_id, replaces)
+    graphdb.query(
+        '''
+        MATCH (d:Document {documentId: $document_id}) SET d.ingested = true
+        ''',
+        params={'document_id': document_id}
+    )
+    answer_cache.invalidate(document_id)
+    if replaced:
+        answer_cache.invalidate(replaces)
+    if settings.RETRIEVER_SEARCH_TYPE == "local":
+        get_local_index().mark_stale()
+    return written
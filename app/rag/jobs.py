@@ -0,0 +1,139 @@
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from app.core.config import settings
+from app.core.metrics import Trace, current_trace, span
+from app.models.job import IngestionJob
+from app.rag.ingestion import begin_ingestion, end_ingestion, ingest_document
+
+executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix='ingest')
+
+_jobs = OrderedDict()
+_active_jobs = {}
+_batches = OrderedDict()
+_jobs_lock = Lock()
+
+
+def _run_job(job: IngestionJob, file_path: str):
+    """
+    Runs an ingestion job on a worker thread and records its outcome.
+
+    Args:
+        job (IngestionJob): The job to run.
+        file_path (str): Path of the pdf file on disk.
+    """
+    job.status = 'running'
+    trace = Trace()
+    token = current_trace.set(trace)
+    try:
+        with span("ingest.total"):
+            ingest_document(file_path, job.filename, job.document_id, job=job, replaces=job.replaces)
+        job.status = 'completed'
+    except Exception as e:
+        print(f"> ❌ \033[91mIngestion of {job.filename} failed: {e}\033[0m")
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        current_trace.reset(token)
+        job.timings = trace.totals()
+        end_ingestion(job.document_id)
+        with _jobs_lock:
+            _active_jobs.pop(job.document_id, None)
+
+
+def submit_ingestion(file_path: str, filename: str, document_id: str, replaces: str = None) -> IngestionJob:
+    """
+    Queues a document for ingestion on the bounded worker pool.
+
+    A document that is already queued or running is not queued twice, the
+    in-flight job is returned instead.
+
+    Args:
+        file_path (str): Path of the pdf file on disk.
+        filename (str): Original name of the uploaded file.
+        document_id (str): Id of the Document node.
+        replaces (str): Id of the previous version of the document, deleted once this one is stored.
+
+    Returns:
+        IngestionJob: The queued job.
+    """
+    with _jobs_lock:
+        if document_id in _active_jobs:
+            return _active_jobs[document_id]
+        job = IngestionJob(job_id=uuid.uuid4().hex, filename=filename, document_id=document_id, replaces=replaces)
+        _active_jobs[document_id] = job
+        _jobs[job.job_id] = job
+        while len(_jobs) > settings.INGEST_JOB_HISTORY:
+            _jobs.popitem(last=False)
+    # A queued document is protected from removal as a previous version too
+    begin_ingestion(document_id)
+    executor.submit(_run_job, job, file_path)
+    return job
+
+
+def queued_count() -> int:
+    """
+    Returns:
+        int: Number of jobs waiting for a free ingestion worker.
+    """
+    with _jobs_lock:
+        return sum(1 for job in _active_jobs.values() if job.status == 'queued')
+
+
+def get_job(job_id: str):
+    """
+    Looks up an ingestion job.
+
+    Args:
+        job_id (str): Id returned when the job was submitted.
+
+    Returns:
+        IngestionJob | None: The job, or None if it is unknown or was evicted.
+    """
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def create_batch(files):
+    """
+    Records the per-file results of a bulk upload.
+
+    Args:
+        files (list): Dicts with the `filename` and either a `job_id`, a `status` or an `error`.
+
+    Returns:
+        str: Id of the batch.
+    """
+    batch_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _batches[batch_id] = files
+        while len(_batches) > settings.INGEST_JOB_HISTORY:
+            _batches.popitem(last=False)
+    return batch_id
+
+
+def get_batch(batch_id: str):
+    """
+    Looks up a bulk upload with the current status of its jobs.
+
+    Args:
+        batch_id (str): Id returned by the bulk upload.
+
+    Returns:
+        dict | None: The files and a count of them by status, or None if the batch is unknown or was evicted.
+    """
+    with _jobs_lock:
+        files = _batches.get(batch_id)
+        if files is None:
+            return None
+        files = [
+            {**entry, **_jobs[entry['job_id']].model_dump()} if entry.get('job_id') in _jobs else dict(entry)
+            for entry in files
+        ]
+    summary = {}
+    for entry in files:
+        status = entry.get('status', 'failed')
+        summary[status] = summary.get(status, 0) + 1
+    return {'batch_id': batch_id, 'files': files, 'summary': summary}
@@ -0,0 +1,91 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from app.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def get_parse_executor():
+    # spawn keeps the workers free of the parent's threads and open connections
+    return ProcessPoolExecutor(
+        max_workers=settings.PARSE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _extract_pages(file_path, start, end):
+    """
+    Extracts the text of a range of pages. Runs in a worker process.
+
+    Args:
+        file_path (str): Path of the pdf file on disk.
+        start (int): First page number, inclusive.
+        end (int): Last page number, exclusive.
+
+    Returns:
+        list: (page number, text) tuples.
+    """
+    reader = PdfReader(file_path)
+    return [(number, reader.pages[number].extract_text()) for number in range(start, end)]
+
+
+def iter_pages(file_path, batch_size=None):
+    """
+    Yields the pages of a pdf file in order, extracting their text in parallel.
+
+    At most two batches per worker are in flight, so memory stays bounded
+    regardless of the number of pages.
+
+    Args:
+        file_path (str): Path of the pdf file on disk.
+        batch_size (int): Number of pages extracted per worker task.
+
+    Returns:
+        generator: Documents with the same metadata PyPDFLoader produces.
+    """
+    if settings.PARSE_WORKERS <= 1:
+        from langchain_community.document_loaders import PyPDFLoader
+        yield from PyPDFLoader(file_path).lazy_load()
+        return
+
+    batch_size = batch_size or settings.PARSE_BATCH_SIZE
+    page_count = len(PdfReader(file_path).pages)
+    executor = get_parse_executor()
+    ranges = deque(
+        (start, min(start + batch_size, page_count))
+        for start in range(0, page_count, batch_size)
+    )
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < 2 * settings.PARSE_WORKERS:
+            start, end = ranges.popleft()
+            in_flight.append(executor.submit(_extract_pages, file_path, start, end))
+        for number, text in in_flight.popleft().result():
+            yield Document(page_content=text, metadata={'source': file_path, 'page': number})
+
+
+def iter_page_windows(pages, window_size=None):
+    """
+    Groups a stream of pages into windows processed together.
+
+    Args:
+        pages (iterable): The pages of a document.
+        window_size (int): Number of pages per window.
+
+    Returns:
+        generator: Lists of at most `window_size` pages.
+    """
+    window_size = window_size or settings.INGEST_PAGE_WINDOW
+    window = []
+    for page in pages:
+        window.append(page)
+        if len(window) >= window_size:
+            yield window
+            window = []
+    if window:
+        yield window
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import uuid
+import zipfile
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+ZIP_CONTENT_TYPES = ('application/zip', 'application/x-zip-compressed')
+
+
+def _part_path(suffix='part'):
+    os.makedirs(settings.RAG_UPLOAD_DIR, exist_ok=True)
+    return os.path.join(settings.RAG_UPLOAD_DIR, f'.{uuid.uuid4().hex}.{suffix}')
+
+
+def _store_as(tmp_path, file_hash):
+    document_id = file_hash.hexdigest()
+    file_path = os.path.join(settings.RAG_UPLOAD_DIR, f'{document_id}.pdf')
+    os.replace(tmp_path, file_path)
+    return document_id, file_path
+
+
+async def save_upload(file: UploadFile, max_bytes=None):
+    """
+    Streams an uploaded file to disk, hashing it in the same pass.
+
+    The file is written under a temporary name and renamed after its content
+    hash, so concurrent uploads sharing a filename never overwrite each other.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        max_bytes (int): Size over which the file is rejected, None for no limit.
+
+    Returns:
+        tuple: The content hash (document id) and the path of the stored file.
+
+    Raises:
+        ValueError: If the file is larger than `max_bytes`.
+    """
+    tmp_path = _part_path()
+    file_hash = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as file_buffer:
+            while chunk := await file.read(settings.UPLOAD_READ_SIZE):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError('The file is too large')
+                file_hash.update(chunk)
+                file_buffer.write(chunk)
+        return _store_as(tmp_path, file_hash)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def is_zip_upload(file: UploadFile):
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or '').lower().endswith('.zip')
+
+
+async def save_zip_upload(file: UploadFile):
+    """
+    Streams an uploaded zip archive to disk.
+
+    Args:
+        file (UploadFile): The uploaded archive.
+
+    Returns:
+        str: Path of the stored archive, to be removed by the caller.
+    """
+    archive_path = _part_path('zip')
+    try:
+        with open(archive_path, 'wb') as file_buffer:
+            while chunk := await file.read(settings.UPLOAD_READ_SIZE):
+                file_buffer.write(chunk)
+    except Exception:
+        os.remove(archive_path)
+        raise
+    return archive_path
+
+
+def member_name(name):
+    """
+    Sanitises the path of an archive member into a relative document name.
+
+    Directories are kept so `a/report.pdf` and `b/report.pdf` stay distinct,
+    while absolute paths, drive letters and `..` segments are dropped.
+
+    Args:
+        name (str): Path of the member in the archive.
+
+    Returns:
+        str: The relative path with `/` separators.
+    """
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    if parts and parts[0].endswith(':'):
+        parts = parts[1:]
+    return '/'.join(parts)
+
+
+def extract_pdfs(archive_path, archive_name, max_files=None):
+    """
+    Stores the pdf files of a zip archive like uploaded files, one member at a time.
+
+    Members that are not pdf files are ignored. Members over
+    `settings.BULK_MAX_FILE_BYTES` once decompressed are rejected. Members
+    keep their sanitised relative path as filename.
+
+    Args:
+        archive_path (str): Path of the zip archive.
+        archive_name (str): Name of the uploaded archive, used in errors.
+        max_files (int): Maximum number of pdf files extracted.
+
+    Returns:
+        list: Dicts with the `filename` and either its `document_id` and `file_path` or an `error`.
+    """
+    max_files = max_files or settings.BULK_MAX_FILES
+    if not zipfile.is_zipfile(archive_path):
+        return [{'filename': archive_name, 'error': 'The file is not a valid zip archive'}]
+
+    results = []
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [
+            member for member in archive.infolist()
+            if not member.is_dir() and member.filename.lower().endswith('.pdf')
+            and not os.path.basename(member.filename).startswith('.')
+        ]
+        for member in members[:max_files]:
+            filename = member_name(member.filename)
+            if member.file_size > settings.BULK_MAX_FILE_BYTES:
+                results.append({'filename': filename, 'error': 'The file is too large'})
+                continue
+
+            tmp_path = _part_path()
+            file_hash = hashlib.sha256()
+            size = 0
+            try:
+                with archive.open(member) as source, open(tmp_path, 'wb') as file_buffer:
+                    while chunk := source.read(settings.UPLOAD_READ_SIZE):
+                        # The declared size is not trusted, the decompressed bytes are counted
+                        size += len(chunk)
+                        if size > settings.BULK_MAX_FILE_BYTES:
+                            raise ValueError('The file is too large')
+                        file_hash.update(chunk)
+                        file_buffer.write(chunk)
+                document_id, file_path = _store_as(tmp_path, file_hash)
+                results.append({'filename': filename, 'document_id': document_id, 'file_path': file_path})
+            except Exception as e:
+                results.append({'filename': filename, 'error': str(e)})
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        if len(members) > max_files:
+            results.append({'filename': archive_name, 'error': f'Only the first {max_files} pdf files were extracted'})
+    return results
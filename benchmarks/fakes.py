@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import time
+from threading import Lock
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model with a configurable latency.
+
+    `latency` is paid before the first token and `token_latency` between
+    streamed tokens. Structured output always grades "yes" after `latency`.
+    """
+
+    answer: str = "The warranty covers repairs for twelve months from the purchase date."
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _usage(self, messages):
+        input_tokens = sum(len(str(message.content)) // 4 for message in messages)
+        output_tokens = len(self.answer) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency + self.token_latency * len(self.answer.split()))
+        message = AIMessage(content=self.answer, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency + self.token_latency * len(self.answer.split()))
+        message = AIMessage(content=self.answer, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for word in self.answer.split(" "):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for word in self.answer.split(" "):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages)))
+
+    def with_structured_output(self, schema, **kwargs):
+        latency = self.latency
+
+        def grade(_):
+            time.sleep(latency)
+            return schema(grade="yes")
+
+        async def agrade(_):
+            await asyncio.sleep(latency)
+            return schema(grade="yes")
+
+        return RunnableLambda(grade, afunc=agrade)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings derived from the text hash, with a latency per request.
+    """
+
+    def __init__(self, size=1536, latency=0.0, **kwargs):
+        self.size = size
+        self.latency = latency
+        self.requests = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.size).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class InMemoryGraph:
+    """
+    Stand-in for Neo4jGraph answering the queries issued by app.rag.ingestion.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.chunks = {}
+        self.queries = 0
+        self._lock = Lock()
+
+    def query(self, query, params=None):
+        params = params or {}
+        with self._lock:
+            self.queries += 1
+            if "MERGE (d:Document" in query:
+                self.documents.setdefault(
+                    params["document_id"],
+                    {"name": params["name"], "chunks": set(), "ingested": False}
+                )
+                return []
+            if "UNWIND $chunks" in query:
+                document = self.documents[params["document_id"]]
+                for row in params["chunks"]:
+                    chunk = self.chunks.setdefault(row["chunk_id"], {"text": row["text"], "embedding": None})
+                    if row.get("embedding") is not None:
+                        chunk["embedding"] = row["embedding"]
+                    document["chunks"].add(row["chunk_id"])
+                return []
+            if "c.chunkId IN $chunk_ids" in query:
+                return [
+                    {"chunk_id": chunk_id} for chunk_id in params["chunk_ids"]
+                    if self.chunks.get(chunk_id, {}).get("embedding") is not None
+                ]
+            if "MATCH (old:Document" in query:
+                self.documents.pop(params["replaces"], None)
+                referenced = set().union(*(document["chunks"] for document in self.documents.values()))
+                for chunk_id in set(self.chunks) - referenced:
+                    del self.chunks[chunk_id]
+                return []
+            if "SET d.ingested = true" in query:
+                self.documents[params["document_id"]]["ingested"] = True
+                return []
+            raise ValueError(f"Query not supported by the in-memory graph: {query}")
+
+
+class InMemoryRetriever(BaseRetriever):
+    """
+    Exact cosine top-k over the chunks held by an InMemoryGraph.
+    """
+
+    graph: Any
+    embeddings: Any
+    k: int = 4
+    document_ids: Optional[List[str]] = None
+
+    def _search(self, vector):
+        with self.graph._lock:
+            if self.document_ids:
+                chunk_ids = set().union(*(
+                    self.graph.documents[document_id]["chunks"]
+                    for document_id in self.document_ids if document_id in self.graph.documents
+                ))
+            else:
+                chunk_ids = set(self.graph.chunks)
+            rows = [
+                (chunk_id, self.graph.chunks[chunk_id]) for chunk_id in chunk_ids
+                if self.graph.chunks[chunk_id]["embedding"] is not None
+            ]
+        if not rows:
+            return []
+        matrix = np.asarray([chunk["embedding"] for _, chunk in rows], dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        top = np.argsort(-scores)[:self.k]
+        return [
+            Document(
+                page_content=rows[index][1]["text"],
+                metadata={"chunk_id": rows[index][0], "score": float(scores[index])}
+            )
+            for index in top
+        ]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._search(self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._search(await self.embeddings.aembed_query(query))
@@ -0,0 +1,64 @@
+import random
+
+WORDS = (
+    "warranty coverage product store customer repair replacement period contract "
+    "policy claim service technician invoice purchase damage battery screen device "
+    "months year extended plan exclusion return refund support procedure request"
+).split()
+
+
+def _page_text(rng, sentences):
+    lines = []
+    for _ in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+        lines.append(" ".join(words).capitalize() + ".")
+    return lines
+
+
+def make_pdf(pages, sentences_per_page=20, seed=0):
+    """
+    Builds a text PDF with deterministic pseudo-random content.
+
+    Args:
+        pages (int): Number of pages.
+        sentences_per_page (int): Sentences written on every page.
+        seed (int): Seed of the content, different seeds give different documents.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        stream = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in _page_text(rng, sentences_per_page):
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            stream.append(f"({escaped}) '")
+        stream.append("ET")
+        content = "\n".join(stream).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
@@ -0,0 +1,308 @@
+"""
+Offline benchmarks for document ingestion and chat.
+
+The app runs in-process against deterministic fake chat and embedding models
+with configurable latency and an in-memory graph and retriever, so no OpenAI
+key or Neo4j server is needed.
+
+Usage:
+    python -m benchmarks.run ingest --pages 1 10 100 1000 --concurrency 1 4
+    python -m benchmarks.run chat --concurrency 1 8 64 --requests 128 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, InMemoryGraph, InMemoryRetriever
+from benchmarks.pdf import make_pdf
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def current_rss_mb():
+    """
+    Returns the current resident set size of the process in MiB, None where /proc is missing.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return None
+
+
+class RssSampler:
+    """
+    Samples the resident set size in a thread while a scenario runs.
+
+    ru_maxrss only grows over the life of the process, so after the first
+    large scenario it hides the footprint of every later one. The sampler
+    reports the peak reached during the scenario and its growth over the RSS
+    at the start. Without /proc the process-wide ru_maxrss is reported instead.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss_mb()
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.baseline is None:
+            # ru_maxrss is reported in kilobytes on Linux
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+    @property
+    def growth(self):
+        return None if self.baseline is None else self.peak - self.baseline
+
+
+class Harness:
+    """
+    Patches the app's model, embedding and database factories with the fakes.
+    """
+
+    def __init__(self, args):
+        from app.core.config import settings
+        import app.agent.nodes as nodes
+        import app.agent.utils as utils
+        import app.api.routes.agent as agent_routes
+        import app.api.routes.rag.document as document_routes
+        import app.rag.ingestion as ingestion
+
+        workdir = tempfile.mkdtemp(prefix="pdf-agent-bench-")
+        settings.RAG_UPLOAD_DIR = os.path.join(workdir, "uploads")
+        settings.GRADE_CACHE_PATH = os.path.join(workdir, "grades.sqlite")
+        settings.EMBEDDING_CACHE_ENABLED = False
+        settings.ANSWER_CACHE_ENABLED = args.answer_cache
+        settings.PARSE_WORKERS = args.parse_workers
+
+        self.graph = InMemoryGraph()
+        self.embeddings = FakeEmbeddings(latency=args.embedding_latency)
+        llm = FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency)
+
+        for getter in (
+            utils.get_qa_chain, utils.get_fallback_chain,
+            utils.get_hallucination_chain, utils.get_answerability_chain
+        ):
+            getter.cache_clear()
+        utils.get_llm = lambda: llm
+        utils.get_embeddings = lambda: self.embeddings
+        agent_routes.get_embeddings = utils.get_embeddings
+        nodes.get_retriever = lambda k=None: InMemoryRetriever(
+            graph=self.graph, embeddings=self.embeddings, k=k or settings.RETRIEVER_K
+        )
+        nodes.get_scoped_retriever = lambda document_ids, k=None: InMemoryRetriever(
+            graph=self.graph, embeddings=self.embeddings, k=k or settings.RETRIEVER_K,
+            document_ids=list(document_ids)
+        )
+        ingestion.get_neo4j_graph = lambda: self.graph
+        ingestion.ensure_schema = lambda: None
+        ingestion.ScheduledOpenAIEmbeddings = lambda **kwargs: self.embeddings
+
+        async def find_ingested_document(document_id):
+            document = self.graph.documents.get(document_id)
+            if document and document["ingested"]:
+                return {"document_id": document_id, "filename": document["name"]}
+            return None
+
+        document_routes.find_ingested_document = find_ingested_document
+
+    async def upload(self, data, filename):
+        """
+        Uploads a pdf through the route and waits for its ingestion job.
+
+        Returns:
+            float: Seconds from the upload to the end of the ingestion.
+        """
+        from starlette.datastructures import Headers, UploadFile
+        from app.api.routes.rag.document import upload_document
+        from app.rag.jobs import get_job
+
+        started = time.perf_counter()
+        upload = UploadFile(
+            file=io.BytesIO(data), filename=filename,
+            headers=Headers({"content-type": "application/pdf"})
+        )
+        result = await upload_document(upload, replaces=None)
+        if "job_id" not in result:
+            raise RuntimeError(f"Upload failed: {result}")
+        while True:
+            job = get_job(result["job_id"])
+            if job.status == "failed":
+                raise RuntimeError(f"Ingestion failed: {job.error}")
+            if job.status == "completed":
+                return time.perf_counter() - started
+            await asyncio.sleep(0.005)
+
+    async def ask(self, question):
+        """
+        Sends a question through the chat route and consumes the stream.
+
+        Returns:
+            tuple: Seconds to the first token and to the end of the stream.
+        """
+        from app.api.routes.agent import chat
+        from app.models.chat import Chat
+
+        started = time.perf_counter()
+        first_token = None
+        response = await chat(Chat(message=question, thread_id=uuid.uuid4().hex), x_trace=None)
+        async for line in response.body_iterator:
+            event = json.loads(line)
+            if event["event"] == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event["event"] == "error":
+                raise RuntimeError(event["content"])
+        total = time.perf_counter() - started
+        return (first_token if first_token is not None else total), total
+
+
+def run_scenario(coroutine, trace_memory):
+    """
+    Runs a scenario and measures its wall time and memory.
+
+    Returns:
+        tuple: The scenario result, its wall seconds and a dict of the memory columns.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        result = asyncio.run(coroutine)
+        wall = time.perf_counter() - started
+    memory = {"peak_rss_mb": rss.peak, "rss_growth_mb": rss.growth, "peak_heap_mb": None}
+    if trace_memory:
+        memory["peak_heap_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, wall, memory
+
+
+def bench_ingest(harness, args):
+    results = []
+    seed = 0
+    for pages in args.pages:
+        for concurrency in args.concurrency:
+            documents = []
+            for _ in range(concurrency):
+                seed += 1
+                documents.append((make_pdf(pages, seed=seed), f"bench-{seed}.pdf"))
+
+            async def scenario():
+                return await asyncio.gather(*(harness.upload(data, name) for data, name in documents))
+
+            latencies, wall, memory = run_scenario(scenario(), args.trace_memory)
+            results.append({
+                "benchmark": "ingest",
+                "pages": pages,
+                "concurrency": concurrency,
+                "documents": concurrency,
+                "pages_per_second": pages * concurrency / wall,
+                "p50_seconds": percentile(latencies, 50),
+                "p95_seconds": percentile(latencies, 95),
+                "p99_seconds": percentile(latencies, 99),
+                **memory,
+            })
+            print_row(results[-1])
+    return results
+
+
+def bench_chat(harness, args):
+    asyncio.run(harness.upload(make_pdf(args.corpus_pages, seed=10_000), "bench-corpus.pdf"))
+    results = []
+    for concurrency in args.concurrency:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index):
+            async with semaphore:
+                return await harness.ask(f"How long does the warranty cover repairs? ({index})")
+
+        async def scenario():
+            return await asyncio.gather(*(one(index) for index in range(args.requests)))
+
+        timings, wall, memory = run_scenario(scenario(), args.trace_memory)
+        ttft = [first for first, _ in timings]
+        latencies = [total for _, total in timings]
+        results.append({
+            "benchmark": "chat",
+            "concurrency": concurrency,
+            "requests": args.requests,
+            "requests_per_second": args.requests / wall,
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+            "p99_seconds": percentile(latencies, 99),
+            "p50_ttft_seconds": percentile(ttft, 50),
+            "p95_ttft_seconds": percentile(ttft, 95),
+            **memory,
+        })
+        print_row(results[-1])
+    return results
+
+
+def print_row(row):
+    print("  ".join(
+        f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in row.items() if value is not None
+    ), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=["ingest", "chat", "all"])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=128, help="chat requests per concurrency level")
+    parser.add_argument("--corpus-pages", type=int, default=20, help="pages ingested before the chat benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds before the first token of every LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per embedding request")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the peak Python heap (slower)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    harness = Harness(args)
+    results = []
+    if args.benchmark in ("ingest", "all"):
+        results += bench_ingest(harness, args)
+    if args.benchmark in ("chat", "all"):
+        results += bench_chat(harness, args)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
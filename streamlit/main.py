@@ -1,55 +1,151 @@
+import hashlib
+import json
+import uuid
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 
 # Local FastAPI server URL for file upload and document listing
 UPLOAD_URL = "http://backend:8000/api/v1/document/upload"
 LIST_DOCUMENTS_URL = "http://backend:8000/api/v1/document"
+JOB_URL = "http://backend:8000/api/v1/document/jobs/{job_id}"
+CHAT_URL = "http://backend:8000/api/v1/messages/chat"
+
+# Seconds the document list is reused before it is fetched again
+DOCUMENTS_TTL_SECONDS = 60
+# Seconds between checks of the ingestion jobs of the uploaded files
+JOB_POLL_SECONDS = 2
+
+
+@st.cache_resource
+def get_session():
+    # Una sola sesión para todas las reruns, reutiliza las conexiones al backend
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=DOCUMENTS_TTL_SECONDS)
+def fetch_documents():
+    response = get_session().get(LIST_DOCUMENTS_URL)
+    response.raise_for_status()
+    return response.json().get('documents', [])
+
+
+def upload_once(uploaded_file):
+    """
+    Uploads a file unless a file with the same content was already uploaded in this session.
+
+    Streamlit reruns the script on every interaction while the file stays
+    selected, the content hash (the backend document id) makes the upload
+    happen only once. The ingestion job of the file is tracked until it ends.
+
+    Returns:
+        dict: The backend response for the file.
+    """
+    uploads = st.session_state.setdefault("uploads", {})
+    file_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    if file_hash not in uploads:
+        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+        response = get_session().post(UPLOAD_URL, files=files)
+        response.raise_for_status()
+        result = response.json()
+        if "error" in result:
+            raise requests.exceptions.RequestException(result["error"])
+        uploads[file_hash] = result
+        if "job_id" in result:
+            # El documento aparece en la lista cuando termina la ingesta
+            st.session_state.setdefault("pending_jobs", set()).add(result["job_id"])
+    return uploads[file_hash]
+
+
+def check_pending_jobs():
+    """
+    Drops the ingestion jobs that ended and refreshes the document list once one did.
+    """
+    pending = st.session_state.get("pending_jobs", set())
+    for job_id in list(pending):
+        response = get_session().get(JOB_URL.format(job_id=job_id))
+        if response.status_code == 404 or response.json().get("status") in ("completed", "failed"):
+            pending.discard(job_id)
+            fetch_documents.clear()
+
+
+def show_documents():
+    try:
+        if st.session_state.get("pending_jobs"):
+            check_pending_jobs()
+            if not st.session_state["pending_jobs"]:
+                # Rerun the whole app so the list stops polling
+                st.rerun()
+        documents = fetch_documents()
+        if st.session_state.get("pending_jobs"):
+            st.caption("⏳ Ingesting the uploaded documents...")
+        if documents:
+            # Display the list of uploaded files in a bullet point list with emojis
+            st.markdown("Here are the documents you've uploaded:")
+            for doc in documents:
+                st.write(f"📄 **{doc['filename']}**")
+        else:
+            st.write("No files found in the database.")
+    except requests.exceptions.RequestException as e:
+        st.error(f"An error occurred while fetching the file list: {e}")
+
+
+def iter_events(response):
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line.decode('utf-8'))
+
+
+def stream_tokens(events, stop):
+    """
+    Yields the answer tokens until the answer is retracted or the stream ends.
+
+    Args:
+        events (iterator): The NDJSON events of the chat response.
+        stop (dict): Receives the `retract` or `error` event that ended the tokens.
+    """
+    for event in events:
+        if event["event"] == "token":
+            yield event["content"]
+        elif event["event"] in ("retract", "error"):
+            stop.update(event)
+            return
+
 
 with st.sidebar:
     "[Get an OpenAI API key](https://platform.openai.com/account/api-keys)"
     "[View the source code](https://github.com/streamlit/llm-examples/blob/main/Chatbot.py)"
     "[![Open in GitHub Codespaces](https://github.com/codespaces/badge.svg)](https://codespaces.new/streamlit/llm-examples?quickstart=1)"
-    
+
     st.header("Upload Document")
     uploaded_file = st.file_uploader("Choose a file to upload", type=["pdf", "docx", "txt"])
 
     # Handle file upload
     if uploaded_file:
         try:
-            # Send the uploaded file to the API
-            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-            response = requests.post(UPLOAD_URL, files=files)
-            response.raise_for_status()
+            upload_once(uploaded_file)
 
             # Display a success message
             st.sidebar.success("File uploaded successfully!")
-        
+
         except requests.exceptions.RequestException as e:
             st.sidebar.error(f"An error occurred during the file upload: {e}")
 
-    # List current files in the database
+    # List current files in the database, polled only while uploads are being ingested
     st.header("Uploaded Documents")
-    try:
-        # Request the list of uploaded files from the API
-        response = requests.get(LIST_DOCUMENTS_URL)
-        response.raise_for_status()
-        
-        # Assuming the response is a JSON list of files
-        documents = response.json().get('documents', [])  # Adjust 'documents' based on the API response structure
-        if documents:
-            # Display the list of uploaded files in a bullet point list with emojis
-            st.markdown("Here are the documents you've uploaded:")
-            for doc in documents:
-                st.write(f"📄 **{doc['filename']}**")
-        else:
-            st.write("No files found in the database.")
-    except requests.exceptions.RequestException as e:
-        st.sidebar.error(f"An error occurred while fetching the file list: {e}")
+    run_every = JOB_POLL_SECONDS if st.session_state.get("pending_jobs") else None
+    st.fragment(run_every=run_every)(show_documents)()
 
 st.title("💬 Chatbot")
 st.caption("🚀 A Streamlit chatbot powered by OpenAI")
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "How can I help you?"}]
+if "thread_id" not in st.session_state:
+    st.session_state["thread_id"] = uuid.uuid4().hex
 
 for msg in st.session_state.messages:
     st.chat_message(msg["role"]).write(msg["content"])
@@ -59,26 +155,35 @@ try:
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.chat_message("user").write(prompt)
     # Realizar la solicitud POST para obtener el flujo de datos
-        response = requests.post(
-            'http://backend:8000/api/v1/messages/chat',
-            json={"message": prompt},
+        response = get_session().post(
+            CHAT_URL,
+            json={"message": prompt, "thread_id": st.session_state["thread_id"]},
             stream=True  # Habilitar el streaming de la respuesta
         )
-        response.raise_for_status()  # Generar excepción en caso de errores HTTP
-
-        # Procesar cada token del flujo de la respuesta
-        for token in response.iter_lines():
-            if token:
-                decoded_token = token.decode('utf-8')
-                
-                # Mostrar el token como un mensaje del asistente en Streamlit
-                st.chat_message("assistant").write(decoded_token)
-                
-                # Guardar el mensaje en el estado de la sesión
-                if "messages" not in st.session_state:
-                    st.session_state.messages = []
-                st.session_state.messages.append({"role": "assistant", "content": decoded_token})
+        if response.status_code == 503:
+            # El backend está saturado y rechazó la pregunta
+            st.warning(response.json().get("error", "The service is busy, please retry later"))
+        else:
+            response.raise_for_status()  # Generar excepción en caso de errores HTTP
+
+            # Los tokens se muestran a medida que llegan en un único mensaje
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                events = iter_events(response)
+                while True:
+                    stop = {}
+                    with placeholder.container():
+                        answer = st.write_stream(stream_tokens(events, stop)) or ""
+                    if stop.get("event") != "retract":
+                        break
+                    # El evaluador rechazó la respuesta, será reemplazada
+                    placeholder.empty()
+                if stop.get("event") == "error":
+                    st.error(stop["content"])
+
+            # Guardar el mensaje en el estado de la sesión
+            st.session_state.messages.append({"role": "assistant", "content": answer or stop.get("content", "")})
 
 except requests.exceptions.RequestException as e:
     # Manejar excepciones en la solicitud HTTP
-    st.error(f"An error occurred: {e}")
\ No newline at end of file
+    st.error(f"An error occurred: {e}")
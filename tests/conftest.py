@@ -0,0 +1,16 @@
+import argparse
+
+import pytest
+
+from benchmarks.run import Harness
+
+
+@pytest.fixture(scope="session")
+def harness():
+    """
+    The app patched with the benchmark fakes, so no OpenAI key or Neo4j server is needed.
+    """
+    return Harness(argparse.Namespace(
+        embedding_latency=0.0, llm_latency=0.0, token_latency=0.0,
+        answer_cache=False, parse_workers=1
+    ))
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import uuid
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import app.agent.nodes as nodes
+from app.agent import graph
+from app.core.config import settings
+from app.rag.ingestion import ingest_document
+from benchmarks.pdf import make_pdf
+
+
+class Grade:
+    def __init__(self, grade):
+        self.grade = grade
+
+
+def test_retracted_generation_is_not_kept_in_the_history(harness, tmp_path, monkeypatch):
+    path = tmp_path / "corpus.pdf"
+    path.write_bytes(make_pdf(2, seed=30))
+    ingest_document(str(path), "corpus.pdf", "agent-corpus")
+
+    monkeypatch.setattr(settings, "GRADE_CACHE_ENABLED", False)
+    monkeypatch.setattr(nodes, "lexically_grounded", lambda generation, documents: False)
+    monkeypatch.setattr(nodes, "get_hallucination_chain", lambda: RunnableLambda(lambda inputs: Grade("no")))
+
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    asyncio.run(graph.ainvoke({"messages": "What does the warranty cover?"}, config))
+
+    messages = asyncio.run(graph.aget_state(config)).values["messages"]
+    answers = [message for message in messages if isinstance(message, AIMessage)]
+    # Only the fallback answer, the rejected generation was removed
+    assert len(answers) == 1
+    assert messages[-1] is answers[0]
+
+
+def test_requests_without_a_thread_get_their_own(harness):
+    from app.api.routes.agent import chat
+    from app.models.chat import Chat
+
+    async def ask():
+        response = await chat(Chat(message="What does the warranty cover?"), x_trace=None)
+        events = [json.loads(line) async for line in response.body_iterator]
+        assert events[-1]["thread_id"] == response.headers["X-Thread-Id"]
+        return events[-1]["thread_id"]
+
+    assert asyncio.run(ask()) != asyncio.run(ask())
+
+
+def _events(message, thread_id=None, x_trace=None):
+    from app.api.routes.agent import chat
+    from app.models.chat import Chat
+
+    async def ask():
+        chat_request = Chat(message=message, **({"thread_id": thread_id} if thread_id else {}))
+        response = await chat(chat_request, x_trace=x_trace)
+        return [json.loads(line) async for line in response.body_iterator]
+
+    return asyncio.run(ask())
+
+
+def test_cache_hits_are_traced_and_timed(harness, monkeypatch):
+    from app.agent.cache import answer_cache
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    question = f"What is covered by warranty {uuid.uuid4().hex}?"
+    _events(question)
+
+    hits = answer_cache.metrics()["hits"]
+    events = _events(question, x_trace="1")
+
+    assert answer_cache.metrics()["hits"] == hits + 1
+    assert events[0] == {"event": "token", "node": "cache", "content": events[0]["content"]}
+    stages = [span["stage"] for span in events[-2]["spans"]]
+    assert events[-2]["event"] == "trace"
+    assert "chat.cache_lookup" in stages and "chat.total" in stages
+    assert events[-1]["event"] == "end"
+
+
+def test_follow_ups_are_neither_cached_nor_served_from_the_cache(harness, monkeypatch):
+    from app.agent.cache import answer_cache
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    follow_up = f"What about the second one {uuid.uuid4().hex}?"
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    _events("Which products have a warranty?", thread_id=first)
+    entries = answer_cache.metrics()["entries"]
+    _events(follow_up, thread_id=first)
+    assert answer_cache.metrics()["entries"] == entries
+
+    hits = answer_cache.metrics()["hits"]
+    _events("Which services are included?", thread_id=second)
+    events = _events(follow_up, thread_id=second)
+    # An opening question in a new thread does not get the other thread's follow-up answer either
+    _events(follow_up)
+
+    assert answer_cache.metrics()["hits"] == hits
+    assert all(event.get("node") != "cache" for event in events)
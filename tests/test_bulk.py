@@ -0,0 +1,58 @@
+import asyncio
+import io
+import time
+import zipfile
+
+from starlette.datastructures import Headers, UploadFile
+
+from app.api.routes.rag.document import upload_documents
+from app.rag.jobs import get_job
+from app.rag.storage import member_name
+from benchmarks.pdf import make_pdf
+
+
+def _wait(job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while (job := get_job(job_id)).status in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return job
+
+
+def test_member_name_keeps_the_relative_path():
+    assert member_name("a/report.pdf") == "a/report.pdf"
+    assert member_name("/etc/../b/./report.pdf") == "etc/b/report.pdf"
+    assert member_name("C:\\docs\\report.pdf") == "docs/report.pdf"
+
+
+def test_zip_members_sharing_a_basename_are_all_ingested(harness):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("a/report.pdf", make_pdf(1, seed=20))
+        zip_file.writestr("b/report.pdf", make_pdf(1, seed=21))
+    upload = UploadFile(
+        file=io.BytesIO(archive.getvalue()), filename="reports.zip",
+        headers=Headers({"content-type": "application/zip"})
+    )
+
+    result = asyncio.run(upload_documents([upload]))
+
+    assert sorted(entry["filename"] for entry in result["files"]) == ["a/report.pdf", "b/report.pdf"]
+    for entry in result["files"]:
+        assert _wait(entry["job_id"]).status == "completed"
+        assert harness.graph.documents[entry["document_id"]]["name"] == entry["filename"]
+
+
+def test_direct_pdf_over_the_size_limit_is_rejected(harness, monkeypatch):
+    from app.core.config import settings
+
+    data = make_pdf(1, seed=22)
+    monkeypatch.setattr(settings, "BULK_MAX_FILE_BYTES", len(data) - 1)
+    upload = UploadFile(
+        file=io.BytesIO(data), filename="large.pdf",
+        headers=Headers({"content-type": "application/pdf"})
+    )
+
+    result = asyncio.run(upload_documents([upload]))
+
+    assert result["files"] == [{"filename": "large.pdf", "error": "The file is too large", "status": "failed"}]
@@ -0,0 +1,32 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.agent.context import count_tokens
+from app.core.config import settings
+from app.rag.chunking import StreamingSemanticChunker
+from benchmarks.fakes import FakeEmbeddings
+
+
+def _chunk(pages, max_tokens):
+    chunker = StreamingSemanticChunker(FakeEmbeddings(), max_tokens=max_tokens, min_tokens=8)
+    return chunker.split(pages) + chunker.flush()
+
+
+@pytest.mark.parametrize("max_tokens", [64, None])
+def test_every_chunk_fits_max_tokens_even_with_unpunctuated_text(max_tokens):
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    table = " ".join(f"cell{row}x{column} {row * column}" for row in range(2000) for column in range(10))
+    pages = [
+        Document(page_content="A short introduction. It has two sentences.", metadata={"page": 1}),
+        Document(page_content=table, metadata={"page": 2}),
+        Document(page_content="Closing remarks after the table.", metadata={"page": 3}),
+    ]
+
+    chunks = _chunk(pages, max_tokens=max_tokens)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk.page_content) <= max_tokens for chunk in chunks)
+    # No text is lost by the split
+    assert "".join("".join(chunk.page_content.split()) for chunk in chunks) == "".join(
+        "".join(page.page_content.split()) for page in pages
+    )
@@ -0,0 +1,35 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+class AsyncOnlyEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        raise AssertionError("the async path must not use the sync embeddings")
+
+    def embed_query(self, text):
+        raise AssertionError("the async path must not use the sync embeddings")
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+def test_async_embeddings_only_send_misses_to_the_async_provider(tmp_path):
+    provider = AsyncOnlyEmbeddings()
+    embeddings = CachedEmbeddings(provider, "model", EmbeddingStore(str(tmp_path / "embeddings.sqlite")))
+
+    assert asyncio.run(embeddings.aembed_documents(["a", "bb", "a"])) == [[1.0], [2.0], [1.0]]
+    assert asyncio.run(embeddings.aembed_documents(["bb", "ccc"])) == [[2.0], [3.0]]
+    assert asyncio.run(embeddings.aembed_query("ccc")) == [3.0]
+    assert asyncio.run(embeddings.aembed_query("dddd")) == [4.0]
+
+    assert provider.calls == [["a", "bb"], ["ccc"], ["dddd"]]
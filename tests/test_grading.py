@@ -0,0 +1,26 @@
+from app.agent.grading import lexically_grounded
+
+DOCUMENTS = (
+    "The gateway supports encrypted connections over TLS and rotates certificates "
+    "every ninety days through the management console."
+)
+
+
+def test_answer_repeating_the_documents_is_grounded():
+    answer = "The gateway supports encrypted connections over TLS and rotates certificates every ninety days."
+    assert lexically_grounded(answer, DOCUMENTS)
+
+
+def test_answer_negating_the_documents_is_left_to_the_grader():
+    for answer in (
+        "The gateway does not support encrypted connections over TLS and rotates certificates every ninety days.",
+        "The gateway doesn't support encrypted connections over TLS or rotate certificates every ninety days.",
+        "The gateway never rotates certificates and supports no encrypted connections over TLS.",
+    ):
+        assert not lexically_grounded(answer, DOCUMENTS)
+
+
+def test_negations_found_in_the_documents_do_not_block_grounding():
+    documents = DOCUMENTS + " The gateway does not support plain text connections."
+    answer = "The gateway does not support plain text connections but supports encrypted connections over TLS."
+    assert lexically_grounded(answer, documents)
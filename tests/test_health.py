@@ -0,0 +1,12 @@
+import json
+
+from app.agent.utils import warmup_status
+from app.api.routes.health import health
+
+
+def test_health_reports_degraded_until_every_component_is_ready(monkeypatch):
+    for state, status_code, status in (("pending", 503, "degraded"), ("failed", 503, "degraded"), ("ready", 200, "ok")):
+        monkeypatch.setitem(warmup_status, "vector_store", state)
+        response = health()
+        assert response.status_code == status_code
+        assert json.loads(response.body)["status"] == status
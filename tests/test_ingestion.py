@@ -0,0 +1,53 @@
+import asyncio
+
+from app.rag.ingestion import begin_ingestion, end_ingestion, ingest_document
+from benchmarks.pdf import make_pdf
+
+
+def _store(tmp_path, name, seed):
+    path = tmp_path / f"{seed}.pdf"
+    path.write_bytes(make_pdf(2, seed=seed))
+    return str(path)
+
+
+def test_documents_sharing_a_name_both_survive(harness, tmp_path):
+    ingest_document(_store(tmp_path, "report.pdf", 1), "report.pdf", "shared-name-1")
+    ingest_document(_store(tmp_path, "report.pdf", 2), "report.pdf", "shared-name-2")
+
+    for document_id in ("shared-name-1", "shared-name-2"):
+        document = harness.graph.documents[document_id]
+        assert document["ingested"]
+        assert document["chunks"]
+        assert document["chunks"] <= set(harness.graph.chunks)
+
+
+def test_new_version_deletes_the_version_it_replaces(harness, tmp_path):
+    ingest_document(_store(tmp_path, "manual.pdf", 3), "manual.pdf", "manual-v1")
+    ingest_document(_store(tmp_path, "manual.pdf", 4), "manual.pdf", "manual-v2", replaces="manual-v1")
+
+    assert "manual-v1" not in harness.graph.documents
+    assert harness.graph.documents["manual-v2"]["ingested"]
+
+
+def test_version_still_being_ingested_is_kept(harness, tmp_path):
+    ingest_document(_store(tmp_path, "notes.pdf", 5), "notes.pdf", "notes-v1")
+    begin_ingestion("notes-v1")
+    try:
+        ingest_document(_store(tmp_path, "notes.pdf", 6), "notes.pdf", "notes-v2", replaces="notes-v1")
+    finally:
+        end_ingestion("notes-v1")
+
+    assert "notes-v1" in harness.graph.documents
+    assert "notes-v2" in harness.graph.documents
+
+
+def test_already_ingested_upload_still_deletes_the_version_it_replaces(harness, tmp_path):
+    from app.api.routes.rag.document import queue_document
+
+    ingest_document(_store(tmp_path, "guide.pdf", 7), "guide.pdf", "guide-v1")
+    ingest_document(_store(tmp_path, "guide.pdf", 8), "guide.pdf", "guide-v2")
+    result = asyncio.run(queue_document("guide.pdf", "guide-v2", _store(tmp_path, "guide.pdf", 8), replaces="guide-v1"))
+
+    assert result["status"] == "Already ingested"
+    assert "guide-v1" not in harness.graph.documents
+    assert harness.graph.documents["guide-v2"]["ingested"]
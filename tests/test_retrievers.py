@@ -0,0 +1,34 @@
+from app.agent.retrievers import HybridRetriever, VECTOR_RRF_QUERY, escape_lucene
+from benchmarks.fakes import FakeEmbeddings
+
+
+class RecordingGraph:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, params=None):
+        self.calls.append((query, params))
+        return []
+
+
+def test_operator_words_are_searched_as_plain_words():
+    assert escape_lucene("what is NOT covered") == "what is not covered"
+    assert escape_lucene("cats AND dogs OR birds") == "cats and dogs or birds"
+    # Only whole words are operators
+    assert escape_lucene("NOTICE of ORDERS") == "NOTICE of ORDERS"
+
+
+def test_special_characters_are_escaped():
+    assert escape_lucene("a+b (c)?") == "a\\+b \\(c\\)\\?"
+
+
+def test_queries_without_words_skip_the_full_text_search():
+    assert escape_lucene("") == ""
+    assert escape_lucene("?!... ()") == ""
+
+    graph = RecordingGraph()
+    HybridRetriever(graph=graph, embeddings=FakeEmbeddings()).invoke("?!...")
+
+    query, params = graph.calls[0]
+    assert query == VECTOR_RRF_QUERY
+    assert "fulltext" not in query
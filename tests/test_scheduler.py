@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+from app.core.scheduler import QueryCoalescer, RateLimiter, ScheduledOpenAIEmbeddings
+
+
+def test_async_queries_are_coalesced_without_threads():
+    calls = []
+
+    def embed_documents(texts):
+        raise AssertionError("the async path must not use the sync embeddings")
+
+    async def aembed_documents(texts):
+        calls.append((list(texts), threading.current_thread()))
+        return [[float(len(text))] for text in texts]
+
+    coalescer = QueryCoalescer(embed_documents, aembed_documents, window=0.01)
+
+    async def ask():
+        return await asyncio.gather(*(coalescer.aembed(text) for text in ["a", "bb", "a", "ccc"]))
+
+    assert asyncio.run(ask()) == [[1.0], [2.0], [1.0], [3.0]]
+    assert [texts for texts, _ in calls] == [["a", "bb", "ccc"]]
+    assert calls[0][1] is threading.main_thread()
+
+
+def test_async_batch_failure_reaches_every_caller():
+    async def aembed_documents(texts):
+        raise RuntimeError("rate limited")
+
+    coalescer = QueryCoalescer(None, aembed_documents, window=0.0)
+
+    async def ask():
+        return await asyncio.gather(coalescer.aembed("a"), coalescer.aembed("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(ask()))
+
+
+def test_every_instance_owns_its_coalescer():
+    first = ScheduledOpenAIEmbeddings(model="text-embedding-3-small", api_key="test")
+    second = ScheduledOpenAIEmbeddings(model="text-embedding-3-small", api_key="test")
+
+    assert first._coalescer() is first._coalescer()
+    assert first._coalescer() is not second._coalescer()
+
+
+def test_interactive_calls_are_admitted_before_bulk_calls():
+    limiter = RateLimiter("test", 600, 0, interactive_reserve=0.0)
+    limiter.requests.level = 0
+    admitted = []
+
+    def bulk():
+        limiter.acquire("bulk")
+        admitted.append("bulk")
+
+    worker = threading.Thread(target=bulk)
+    worker.start()
+    asyncio.run(limiter.aacquire("interactive", timeout=5))
+    admitted.append("interactive")
+    worker.join()
+
+    assert admitted == ["interactive", "bulk"]